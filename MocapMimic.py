@@ -1,9 +1,38 @@
+# NOTE Annotations aren't evaluated when the functions are defined, otherwise the np.ndarray ones would load numpy on startup
+from __future__ import annotations
 import qtm
 from qtm.data.series import _3d
 from qtm.data.object import trajectory
 import math
 import json
 import copy
+import os
+import zlib
+import base64
+import threading
+import queue
+import hashlib
+import time
+import sys
+import types
+import importlib.util
+import concurrent.futures
+
+# Heavy modules are only actually loaded the first time something in them is used, so the menus show up straight away
+def importLazily(Name: str):
+	if Name in sys.modules:
+		return sys.modules[Name]
+	Spec = importlib.util.find_spec(Name)
+	if Spec == None:
+		raise ImportError(f"Mocap Mimic requires {Name}, install it into the Python environment that QTM uses (pip install {Name})")
+	Loader = importlib.util.LazyLoader(Spec.loader)
+	Spec.loader = Loader
+	Module = importlib.util.module_from_spec(Spec)
+	sys.modules[Name] = Module
+	Loader.exec_module(Module)
+	return Module
+
+np = importLazily("numpy")
 
 # ----------------------------------------
 # [BEGIN] UTILS
@@ -147,6 +176,41 @@ def getSelectedRigidBodyTrajectoryIDs() -> list[int]:
 			
 	return rigid_body_trajectory_ids
 
+# NOTE Same checks as above, it just stops at the rigid body instead of gathering its trajectories
+def getSelectedRigidBodyID() -> int:
+	selections = qtm.gui.selection.get_selections("trajectory")
+
+	if len(selections) == 0:
+		return -1
+
+	selected_rigid_body_id = qtm.data.object.trajectory.get_rigid_body_id(selections[0]["id"])
+
+	if selected_rigid_body_id == None:
+		qtm.gui.message.add_message("Mocap Mimic: Non-rigid body trajectory selected", "Not all selected trajectories are associated with a rigid body", "error")
+		return -1
+
+	for selection in selections:
+		rigid_body_id = qtm.data.object.trajectory.get_rigid_body_id(selection["id"])
+		if rigid_body_id != selected_rigid_body_id:
+			qtm.gui.message.add_message("Mocap Mimic: Multiple rigid bodies selected", "Only one rigid body should be selected at a time", "error")
+			return -1
+
+	return selected_rigid_body_id
+
+# Fetches the 6DOF series of the rigid body once, missing samples are stored as None
+def getRigidBodyPoseAsDict(RigidBodyID: int, Range: dict[str: int] = None) -> dict[str]:
+	Samples = qtm.data.series._6d.get_samples(RigidBodyID, Range)
+	Positions = []
+	Rotations = []
+	for sample in Samples:
+		if sample == None or sample.get("position") == None or sample.get("rotation") == None:
+			Positions.append(None)
+			Rotations.append(None)
+			continue
+		Positions.append(list(sample["position"]))
+		Rotations.append(np.asarray(sample["rotation"], dtype=float).reshape(3, 3).tolist())
+	return {"Positions": Positions, "Rotations": Rotations}
+
 def getSelectedSkeletonTrajectoryIDs() -> list[int]:
 	trajectory_ids = qtm.data.object.trajectory.get_trajectory_ids()
 	skeleton_trajectory_ids = []
@@ -235,13 +299,680 @@ def getTrajectoriesFormatted(trajectory_ids: list[int]) -> dict[int: list[list[l
 # [END] UTILS
 # ----------------------------------------
 
+# ----------------------------------------
+# [BEGIN] COMPRESSION
+# ----------------------------------------
+
+# Marker positions and bone transforms are smooth signals, so they are stored as integers quantized to a fixed
+# precision, delta encoded from frame to frame and then run through zlib. The reconstruction error is bounded by
+# half of the precision, which is verified every time something is written.
+bCompressReferences = False
+compressionPositionPrecision: float = 0.01
+compressionRotationPrecision: float = 0.000001
+
+# NOTE To be called in the QTM console
+def setCompressionEnabled(NewValue: bool):
+	global bCompressReferences
+	bCompressReferences = NewValue
+	print(f"bCompressReferences: {NewValue}")
+
+# NOTE Position precision is in mm, rotation precision is for the unitless rotation matrix elements
+def setCompressionPrecision(PositionPrecision: float, RotationPrecision: float = None):
+	global compressionPositionPrecision
+	global compressionRotationPrecision
+	compressionPositionPrecision = PositionPrecision
+	if RotationPrecision != None:
+		compressionRotationPrecision = RotationPrecision
+	print(f"compressionPositionPrecision: {compressionPositionPrecision}, compressionRotationPrecision: {compressionRotationPrecision}")
+
+def encodeChannels(Values: np.ndarray, Precisions: np.ndarray) -> dict[str]:
+	# Values is shaped (frames, channels), missing frames are rows of NaN
+	Missing = np.isnan(Values).any(axis=1)
+	Quantized = np.rint(np.nan_to_num(Values) / Precisions).astype(np.int64)
+
+	# Missing frames repeat the last valid frame so they don't produce big deltas
+	if Missing.any():
+		LastValid = np.where(~Missing, np.arange(len(Missing)), 0)
+		np.maximum.accumulate(LastValid, out=LastValid)
+		Quantized = Quantized[LastValid]
+
+	Deltas = np.diff(Quantized, axis=0, prepend=np.zeros((1, Quantized.shape[1]), dtype=np.int64))
+	DType = "int32" if Deltas.size == 0 or np.abs(Deltas).max() < 2**31 else "int64"
+
+	return {
+		"Encoding": "mmq1",
+		"Shape": list(Values.shape),
+		"Precision": Precisions.tolist(),
+		"DType": DType,
+		"Missing": np.flatnonzero(Missing).tolist(),
+		"Data": base64.b64encode(zlib.compress(Deltas.astype(DType).tobytes(), 9)).decode("ascii"),
+	}
+
+def decodeChannels(Encoded: dict[str]) -> np.ndarray:
+	Deltas = np.frombuffer(zlib.decompress(base64.b64decode(Encoded["Data"])), dtype=Encoded["DType"])
+	Deltas = Deltas.reshape(Encoded["Shape"]).astype(np.int64)
+	Values = np.cumsum(Deltas, axis=0) * np.asarray(Encoded["Precision"])
+	Values[Encoded["Missing"]] = np.nan
+	return Values
+
+def isEncodedChannels(Value) -> bool:
+	return isinstance(Value, dict) and Value.get("Encoding") == "mmq1"
+
+# Only the top three rows of a transform are stored, the bottom one is always [0, 0, 0, 1]
+def getTransformPrecisions() -> np.ndarray:
+	Precisions = np.full(12, compressionRotationPrecision)
+	Precisions[[3, 7, 11]] = compressionPositionPrecision
+	return Precisions
+
+def transformsToArray(Transforms: list) -> np.ndarray:
+	Values = np.full((len(Transforms), 12), np.nan)
+	for i, Transform in enumerate(Transforms):
+		if Transform != None:
+			Values[i] = np.asarray(Transform, dtype=float)[:3].reshape(12)
+	return Values
+
+def arrayToTransforms(Values: np.ndarray) -> list:
+	Matrices = np.zeros((len(Values), 4, 4))
+	Matrices[:, :3] = Values.reshape(-1, 3, 4)
+	Matrices[:, 3, 3] = 1
+	Transforms = Matrices.tolist()
+	for i in np.flatnonzero(np.isnan(Values).any(axis=1)):
+		Transforms[i] = None
+	return Transforms
+
+def encodeSkeleton(BoneDict: dict[str]) -> dict[str]:
+	Bone = {key: val for key, val in BoneDict.items() if key not in ("Transforms", "Children")}
+	Bone.update({"Transforms": encodeChannels(transformsToArray(BoneDict["Transforms"]), getTransformPrecisions())})
+	Bone.update({"Children": [encodeSkeleton(Child) for Child in BoneDict["Children"]]})
+	return Bone
+
+def decodeSkeleton(BoneDict: dict[str]) -> dict[str]:
+	Bone = {key: val for key, val in BoneDict.items() if key not in ("Transforms", "Children")}
+	Bone.update({"Transforms": arrayToTransforms(decodeChannels(BoneDict["Transforms"]))})
+	Bone.update({"Children": [decodeSkeleton(Child) for Child in BoneDict["Children"]]})
+	return Bone
+
+# Samples look like {"position": [x, y, z], "residual": r}, every field becomes its own set of channels
+def trajectoryToArray(Points: list) -> tuple[np.ndarray, list]:
+	FirstPoint = next((point for point in Points if point != None), None)
+	Fields = []
+	if FirstPoint != None:
+		for key, val in FirstPoint.items():
+			Fields.append([key, len(val) if isinstance(val, list) else 0])
+
+	Width = sum(max(size, 1) for key, size in Fields)
+	Values = np.full((len(Points), Width), np.nan)
+	for i, point in enumerate(Points):
+		if point == None:
+			continue
+		Row = []
+		for key, size in Fields:
+			Row += point[key] if size > 0 else [point[key]]
+		Values[i] = Row
+	return Values, Fields
+
+def arrayToTrajectory(Values: np.ndarray, Fields: list) -> list:
+	Columns = []
+	Column = 0
+	for key, size in Fields:
+		if size > 0:
+			Columns.append((key, Values[:, Column:Column + size].tolist()))
+		else:
+			Columns.append((key, Values[:, Column].tolist()))
+		Column += max(size, 1)
+
+	Missing = set(np.flatnonzero(np.isnan(Values).any(axis=1)).tolist())
+	Points = []
+	for i in range(len(Values)):
+		Points.append(None if i in Missing else {key: column[i] for key, column in Columns})
+	return Points
+
+def encodeTrajectory(Points: list) -> dict[str]:
+	Values, Fields = trajectoryToArray(Points)
+	Encoded = encodeChannels(Values, np.full(Values.shape[1], compressionPositionPrecision))
+	Encoded.update({"Fields": Fields})
+	return Encoded
+
+def decodeTrajectory(Encoded: dict[str]) -> list:
+	return arrayToTrajectory(decodeChannels(Encoded), Encoded["Fields"])
+
+def poseToArray(Pose: dict[str]) -> np.ndarray:
+	Values = np.full((len(Pose["Positions"]), 12), np.nan)
+	for i in range(len(Pose["Positions"])):
+		if Pose["Positions"][i] != None:
+			Values[i, :3] = Pose["Positions"][i]
+			Values[i, 3:] = np.asarray(Pose["Rotations"][i], dtype=float).reshape(9)
+	return Values
+
+def encodePose(Pose: dict[str]) -> dict[str]:
+	Precisions = np.full(12, compressionRotationPrecision)
+	Precisions[:3] = compressionPositionPrecision
+	return encodeChannels(poseToArray(Pose), Precisions)
+
+def decodePose(Encoded: dict[str]) -> dict[str]:
+	Values = decodeChannels(Encoded)
+	Positions = Values[:, :3].tolist()
+	Rotations = Values[:, 3:].reshape(-1, 3, 3).tolist()
+	for i in Encoded["Missing"]:
+		Positions[i] = None
+		Rotations[i] = None
+	return {"Positions": Positions, "Rotations": Rotations}
+
+# Directions are unit vectors so they use the rotation precision, the lengths are in mm
+def encodeDirections(DirectionsData: dict[str]) -> dict[str]:
+	Encoded = {}
+	for Mode, Data in DirectionsData.items():
+		Directions = np.asarray(Data["Directions"], dtype=float).reshape(-1, len(Data["BoneNames"]) * 3)
+		Lengths = np.asarray(Data["Lengths"], dtype=float).reshape(-1, len(Data["BoneNames"]))
+		Encoded[Mode] = {
+			"BoneNames": Data["BoneNames"],
+			"Directions": encodeChannels(Directions, np.full(Directions.shape[1], compressionRotationPrecision)),
+			"Lengths": encodeChannels(Lengths, np.full(Lengths.shape[1], compressionPositionPrecision)),
+		}
+	return Encoded
+
+def decodeDirections(DirectionsData: dict[str]) -> dict[str]:
+	Decoded = {}
+	for Mode, Data in DirectionsData.items():
+		Decoded[Mode] = {
+			"BoneNames": Data["BoneNames"],
+			"Directions": decodeChannels(Data["Directions"]).reshape(-1, len(Data["BoneNames"]), 3),
+			"Lengths": decodeChannels(Data["Lengths"]),
+		}
+	return Decoded
+
+def encodeTrajectories(Trajectories: dict[str]) -> dict[str]:
+	return {label: encodeTrajectory(points) for label, points in Trajectories.items()}
+
+def decodeTrajectories(Trajectories: dict[str]) -> dict[str]:
+	return {label: decodeTrajectory(points) if isEncodedChannels(points) else points for label, points in Trajectories.items()}
+
+# NOTE Only the "skeleton", "trajectories", "pose" and "directions" entries are compressed, everything else is left as plain JSON
+def encodeReferenceData(Data: dict[str]) -> dict[str]:
+	Encoded = dict(Data)
+	if "skeleton" in Data:
+		Encoded["skeleton"] = encodeSkeleton(Data["skeleton"])
+	if "trajectories" in Data:
+		Encoded["trajectories"] = encodeTrajectories(Data["trajectories"])
+	if "pose" in Data:
+		Encoded["pose"] = encodePose(Data["pose"])
+	if "directions" in Data:
+		Encoded["directions"] = encodeDirections(Data["directions"])
+	Encoded.update({"Compressed": True})
+	return Encoded
+
+def decodeReferenceData(Data: dict[str]) -> dict[str]:
+	if not Data.get("Compressed", False):
+		return Data
+	Decoded = {key: val for key, val in Data.items() if key != "Compressed"}
+	if "skeleton" in Data:
+		Decoded["skeleton"] = decodeSkeleton(Data["skeleton"])
+	if "trajectories" in Data:
+		Decoded["trajectories"] = decodeTrajectories(Data["trajectories"])
+	if "pose" in Data:
+		Decoded["pose"] = decodePose(Data["pose"])
+	if "directions" in Data:
+		Decoded["directions"] = decodeDirections(Data["directions"])
+	return Decoded
+
+def getSkeletonMaxError(BoneDict: dict[str], DecodedBoneDict: dict[str]) -> np.ndarray:
+	Error = np.abs(transformsToArray(BoneDict["Transforms"]) - transformsToArray(DecodedBoneDict["Transforms"]))
+	Error = np.nan_to_num(Error).max(axis=0, initial=0) - getTransformPrecisions() / 2
+	for i in range(len(BoneDict["Children"])):
+		Error = np.maximum(Error, getSkeletonMaxError(BoneDict["Children"][i], DecodedBoneDict["Children"][i]))
+	return Error
+
+# Makes sure that decoding gives back the original data within half of the precision
+# Returns how far past the bound the worst channel is, anything above 0 means the encoding can't be trusted
+def getEncodingErrorOverBound(Data: dict[str], Encoded: dict[str]) -> float:
+	Decoded = decodeReferenceData(json.loads(json.dumps(Encoded, default=getJSONValue)))
+	# Leaves a bit of room for the floating point error of multiplying the integers back up
+	Slack = 1e-9
+	Worst = -math.inf
+	if "skeleton" in Data:
+		Worst = max(Worst, getSkeletonMaxError(Data["skeleton"], Decoded["skeleton"]).max() - Slack)
+	if "trajectories" in Data:
+		# NOTE Every field is checked, not just the position, the residual is quantized at the same precision
+		for label, points in Data["trajectories"].items():
+			Original = trajectoryToArray(points)[0]
+			Restored = trajectoryToArray(Decoded["trajectories"][label])[0]
+			if Original.shape != Restored.shape or not np.array_equal(np.isnan(Original), np.isnan(Restored)):
+				return math.inf
+			Error = np.nan_to_num(np.abs(Original - Restored)).max(initial=0)
+			Worst = max(Worst, Error - compressionPositionPrecision / 2 - Slack)
+	if "pose" in Data:
+		Original = poseToArray(Data["pose"])
+		Restored = poseToArray(Decoded["pose"])
+		if not np.array_equal(np.isnan(Original), np.isnan(Restored)):
+			return math.inf
+		Error = np.nan_to_num(np.abs(Original - Restored)).max(axis=0, initial=0)
+		Worst = max(Worst, (Error[:3] - compressionPositionPrecision / 2).max() - Slack, (Error[3:] - compressionRotationPrecision / 2).max() - Slack)
+	if "directions" in Data:
+		for Mode, Directions in Data["directions"].items():
+			for key, Precision in (("Directions", compressionRotationPrecision), ("Lengths", compressionPositionPrecision)):
+				Original = np.asarray(Directions[key], dtype=float)
+				Restored = np.asarray(Decoded["directions"][Mode][key], dtype=float).reshape(Original.shape)
+				Error = np.nan_to_num(np.abs(Original - Restored)).max(initial=0)
+				Worst = max(Worst, Error - Precision / 2 - Slack)
+	return Worst
+
+# Everything that has been read from disk, structured like {FileName: ((ModifiedTime, Size), Data)}
+gReferenceCache = {}
+
+# Writes a reference or take file, compressed if the user has enabled it
+# Returns how far past the precision bound the compression was if it had to fall back to saving uncompressed, so
+# it can be reported with reportCompressionFallback on the UI thread, otherwise None
+def writeReferenceFile(FileName: str, Data: dict[str]) -> float:
+	gReferenceCache.pop(FileName, None)
+	ErrorOverBound = None
+	if bCompressReferences:
+		Encoded = encodeReferenceData(Data)
+		ErrorOverBound = getEncodingErrorOverBound(Data, Encoded)
+		if ErrorOverBound <= 0:
+			with open(FileName, "w") as file:
+				json.dump(Encoded, file, default=getJSONValue)
+			return None
+
+	# NOTE Falls back to the uncompressed format rather than saving something that isn't accurate enough
+	with open(FileName, "w") as file:
+		json.dump(Data, file, default=getJSONValue)
+	return ErrorOverBound
+
+def reportCompressionFallback(FileName: str, ErrorOverBound: float) -> None:
+	if ErrorOverBound == None:
+		return
+	qtm.gui.message.add_message("Mocap Mimic: Compression error too large", f"Reconstruction error exceeded the precision bound by {ErrorOverBound}, saving uncompressed instead", "warning")
+	print(f"Compression error exceeded the bound by {ErrorOverBound}, saving {FileName} uncompressed")
+
+# Lets json write out the numpy arrays that are stored in references
+def getJSONValue(Value):
+	if isinstance(Value, (np.ndarray, np.generic)):
+		return Value.tolist()
+	raise TypeError(f"Object of type {type(Value).__name__} is not JSON serializable")
+
+# Files are only parsed and decoded again if they have changed since the last time they were read
+# NOTE A shallow copy is returned so replacing entries doesn't touch the cached data
+# UseCache = False reads the file without touching the cache, for one off reads that would only push out the references
+def readReferenceFile(FileName: str, UseCache: bool = True) -> dict[str]:
+	if not UseCache:
+		with open(FileName, "r") as file:
+			return decodeReferenceData(json.load(file))
+
+	Stat = os.stat(FileName)
+	Version = (Stat.st_mtime_ns, Stat.st_size)
+	Cached = gReferenceCache.get(FileName)
+	if Cached != None and Cached[0] == Version:
+		return dict(Cached[1])
+
+	with open(FileName, "r") as file:
+		Data = decodeReferenceData(json.load(file))
+	gReferenceCache[FileName] = (Version, Data)
+	return dict(Data)
+
+# ----------------------------------------
+# [END] COMPRESSION
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] BACKGROUND JOBS
+# ----------------------------------------
+
+# Long running work is done on a worker thread so that QTM doesn't lock up. All of the QTM data has to be fetched
+# on the UI thread before the job starts, the worker must never call into qtm (that includes print, which goes
+# through the QTM console). Progress and results are handed back to the UI thread by pumpBackgroundJob, which gets
+# called on every redraw of the 3D view while a job is running and before every Mocap Mimic command, so a finished
+# job reports back the next time anything in the menu is used even if the 3D view is hidden or not redrawing.
+# NOTE Every function that takes a Job never calls into qtm and returns None if the job gets cancelled part way
+bRunInBackground = True
+# How long a single pump keeps serving a job's requests for the UI thread (see postToUIThread) before handing
+# control back to QTM
+uiRequestBudgetInMs: float = 50.0
+gCurrentJob = None
+gDrawFunction = None
+
+# NOTE To be called in the QTM console
+def setRunInBackground(NewValue: bool):
+	global bRunInBackground
+	bRunInBackground = NewValue
+	print(f"bRunInBackground: {NewValue}")
+
+def setUIRequestBudgetInMs(NewValue: float):
+	global uiRequestBudgetInMs
+	uiRequestBudgetInMs = NewValue
+	print(f"uiRequestBudgetInMs: {NewValue}")
+
+def isJobRunning() -> bool:
+	return gCurrentJob != None
+
+def isJobCancelled(Job: dict[str]) -> bool:
+	return Job != None and Job["Cancel"].is_set()
+
+# Fraction should be between 0 and 1, safe to call from the worker thread
+def reportJobProgress(Job: dict[str], Fraction: float) -> None:
+	if Job != None:
+		Job["Progress"] = Fraction
+
+# For jobs that have to fetch more from QTM part way through. The worker queues Function up without waiting and
+# picks the result up later with waitForUIThread, so it can ask for the next thing before working on the last one.
+# pumpBackgroundJob keeps running queued requests until uiRequestBudgetInMs is used up, so one pump can serve
+# several of them back to back. Run straight away if it isn't called from the worker
+def postToUIThread(Job: dict[str], Function, *Args) -> dict[str]:
+	Request = {"Function": Function, "Args": Args, "Done": threading.Event(), "Result": None, "Error": None}
+	if Job == None or threading.current_thread() is not Job.get("Thread"):
+		runUIThreadRequest(Request)
+	else:
+		Job["Requests"].put(Request)
+	return Request
+
+# NOTE Returns None if the job gets cancelled while it is waiting
+def waitForUIThread(Job: dict[str], Request: dict[str]):
+	while not Request["Done"].wait(0.05):
+		if isJobCancelled(Job):
+			return None
+
+	if Request["Error"] != None:
+		raise Request["Error"]
+	return Request["Result"]
+
+def runUIThreadRequest(Request: dict[str]) -> None:
+	try:
+		Request["Result"] = Request["Function"](*Request["Args"])
+	except Exception as e:
+		Request["Error"] = e
+	Request["Done"].set()
+
+# Has to be called from the UI thread. Only waits for more requests if the job has asked for something this pump
+def serveUIThreadRequests(Job: dict[str]) -> None:
+	Deadline = time.perf_counter() + uiRequestBudgetInMs / 1000
+	try:
+		Request = Job["Requests"].get_nowait()
+	except queue.Empty:
+		return
+
+	while True:
+		runUIThreadRequest(Request)
+		Remaining = Deadline - time.perf_counter()
+		if Remaining <= 0:
+			return
+		try:
+			Request = Job["Requests"].get(timeout=Remaining)
+		except queue.Empty:
+			return
+
+def runJob(Job: dict[str]) -> None:
+	try:
+		Job["Result"] = Job["Work"](Job)
+	except Exception as e:
+		Job["Error"] = e
+	Job["Done"].set()
+
+# Work(Job) is run on the worker thread and OnDone(Result) is run on the UI thread once it has finished
+# The result of a cancelled job is thrown away
+def startBackgroundJob(Name: str, Work, OnDone = None) -> bool:
+	global gCurrentJob
+
+	pumpBackgroundJob()
+	if isJobRunning():
+		qtm.gui.message.add_message(f"Mocap Mimic: {gCurrentJob['Name']} is still running", "Wait for it to finish or cancel it before starting something new", "error")
+		return False
+
+	Job = {
+		"Name": Name,
+		"Work": Work,
+		"OnDone": OnDone,
+		"Progress": 0.0,
+		"ReportedProgress": 0.0,
+		"Cancel": threading.Event(),
+		"Done": threading.Event(),
+		"Result": None,
+		"Error": None,
+		"Requests": queue.SimpleQueue(),
+	}
+
+	# NOTE Running it in the foreground is mostly useful for debugging from the console
+	if not bRunInBackground:
+		runJob(Job)
+		finishJob(Job)
+		return True
+
+	gCurrentJob = Job
+	qtm.gui.message.add_message(f"Mocap Mimic: {Name} started", "Results show up when the 3D view redraws or with 'Running Job Status', use 'Cancel Running Job' to stop it", "info")
+	Job["Thread"] = threading.Thread(target=runJob, args=(Job,), daemon=True)
+	Job["Thread"].start()
+	updateDrawFunction()
+	return True
+
+def finishJob(Job: dict[str]) -> None:
+	if Job["Error"] != None:
+		qtm.gui.message.add_message(f"Mocap Mimic: {Job['Name']} failed", str(Job["Error"]), "error")
+		print(f"{Job['Name']} failed: {Job['Error']!r}")
+	elif isJobCancelled(Job):
+		qtm.gui.message.add_message(f"Mocap Mimic: {Job['Name']} cancelled", "", "info")
+		print(f"{Job['Name']} cancelled")
+	elif Job["OnDone"] != None:
+		Job["OnDone"](Job["Result"])
+
+# Has to be called from the UI thread
+def pumpBackgroundJob() -> None:
+	global gCurrentJob
+	Job = gCurrentJob
+	if Job == None:
+		return
+
+	serveUIThreadRequests(Job)
+
+	if not Job["Done"].is_set():
+		# Only posts a message for every tenth of the way so the message list doesn't get flooded
+		if Job["Progress"] - Job["ReportedProgress"] >= 0.1:
+			Job["ReportedProgress"] = Job["Progress"]
+			qtm.gui.message.add_message(f"Mocap Mimic: {Job['Name']} {Job['Progress'] * 100:.0f}%", "", "info")
+		return
+
+	gCurrentJob = None
+	updateDrawFunction()
+	finishJob(Job)
+
+def cancelBackgroundJob() -> None:
+	if not isJobRunning():
+		print("No job running")
+		return
+	gCurrentJob["Cancel"].set()
+	print(f"Cancelling {gCurrentJob['Name']}...")
+
+def printBackgroundJobStatus() -> None:
+	pumpBackgroundJob()
+	if not isJobRunning():
+		print("No job running")
+		return
+	print(f"{gCurrentJob['Name']}: {gCurrentJob['Progress'] * 100:.0f}%")
+
+# Wraps a menu command so that it picks up whatever a running job has finished before doing anything else
+def getPumpedCommand(Function):
+	def PumpedCommand(*args, **kwargs):
+		pumpBackgroundJob()
+		return Function(*args, **kwargs)
+	PumpedCommand.__name__ = Function.__name__
+	return PumpedCommand
+
+def dispatchDrawFunction(measurement_time):
+	pumpBackgroundJob()
+	if gDrawFunction != None:
+		gDrawFunction(measurement_time)
+
+# The 3D view only has one draw function, so drawing and job pumping share it
+def setDrawFunction(DrawFunction = None) -> None:
+	global gDrawFunction
+	gDrawFunction = DrawFunction
+	updateDrawFunction()
+
+def updateDrawFunction() -> None:
+	if gDrawFunction != None or isJobRunning():
+		qtm.gui._3d.set_draw_function(dispatchDrawFunction)
+	else:
+		qtm.gui._3d.set_draw_function()
+
+# ----------------------------------------
+# [END] BACKGROUND JOBS
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] RESULT CACHE
+# ----------------------------------------
+
+# Comparison results are stored on disk keyed by a hash of everything that went into them, so running the same
+# comparison again (or splitting it into different segments) doesn't redo any of the work.
+# When the cache grows past its size limit the least recently used results are thrown away.
+bUseResultCache = True
+resultCacheMaxSizeInMB: float = 256
+
+# NOTE To be called in the QTM console
+def setResultCacheEnabled(NewValue: bool):
+	global bUseResultCache
+	bUseResultCache = NewValue
+	print(f"bUseResultCache: {NewValue}")
+
+def setResultCacheMaxSizeInMB(NewValue: float):
+	global resultCacheMaxSizeInMB
+	resultCacheMaxSizeInMB = NewValue
+	print(f"resultCacheMaxSizeInMB: {NewValue}")
+	evictResultCache()
+
+def getResultCacheDirectory() -> str:
+	return f"{getProjectDirectory()}MocapMimicCache/"
+
+def getSkeletonContentHash(BoneDict: dict[str], Hash = None) -> str:
+	IsRoot = Hash == None
+	if IsRoot:
+		Hash = hashlib.sha1()
+
+	Hash.update(BoneDict["Name"].encode())
+	try:
+		Transforms = np.array(BoneDict["Transforms"], dtype=float)
+	except (TypeError, ValueError):
+		# Missing samples are None, which numpy can't turn into a plain float array
+		Transforms = transformsToArray(BoneDict["Transforms"])
+	Hash.update(np.ascontiguousarray(Transforms).tobytes())
+
+	Hash.update(str(len(BoneDict["Children"])).encode())
+	for Child in BoneDict["Children"]:
+		getSkeletonContentHash(Child, Hash)
+
+	return Hash.hexdigest() if IsRoot else None
+
+def getTrajectoriesContentHash(Trajectories: dict[str]) -> str:
+	return hashlib.sha1(json.dumps(Trajectories, sort_keys=True).encode()).hexdigest()
+
+# NOTE Bumped whenever the scores themselves change, so nothing worked out the old way gets picked up again
+resultCacheVersion: int = 2
+
+def getResultCacheKey(Parts: list) -> str:
+	return hashlib.sha1(json.dumps([resultCacheVersion] + Parts).encode()).hexdigest()
+
+# Returns the arrays that were stored under the key, or None if there is nothing cached
+def loadCachedResult(Key: str) -> dict[str: np.ndarray]:
+	if not bUseResultCache:
+		return None
+
+	FileName = f"{getResultCacheDirectory()}{Key}.npz"
+	if not os.path.exists(FileName):
+		return None
+
+	try:
+		with np.load(FileName) as file:
+			Arrays = {key: file[key] for key in file.files}
+	except (OSError, ValueError):
+		return None
+
+	# NOTE Touching the file marks it as recently used for the eviction
+	os.utime(FileName)
+	return Arrays
+
+def saveCachedResult(Key: str, Arrays: dict[str: np.ndarray]) -> None:
+	if not bUseResultCache:
+		return
+
+	os.makedirs(getResultCacheDirectory(), exist_ok=True)
+	FileName = f"{getResultCacheDirectory()}{Key}.npz"
+	# Written to a temporary file first so that a half written result is never picked up
+	TempFileName = f"{FileName}.{threading.get_ident()}.tmp"
+	with open(TempFileName, "wb") as file:
+		np.savez_compressed(file, **Arrays)
+	os.replace(TempFileName, FileName)
+
+	evictResultCache()
+
+def evictResultCache() -> None:
+	Directory = getResultCacheDirectory()
+	if not os.path.isdir(Directory):
+		return
+
+	Entries = []
+	for FileName in os.listdir(Directory):
+		if FileName.endswith(".npz"):
+			Stat = os.stat(f"{Directory}{FileName}")
+			Entries.append((Stat.st_mtime, Stat.st_size, FileName))
+
+	# Oldest first
+	Entries.sort()
+	TotalSize = sum(entry[1] for entry in Entries)
+	MaxSize = resultCacheMaxSizeInMB * 1024 * 1024
+	for mtime, size, FileName in Entries:
+		if TotalSize <= MaxSize:
+			break
+		os.remove(f"{Directory}{FileName}")
+		TotalSize -= size
+
+def clearResultCache() -> None:
+	Directory = getResultCacheDirectory()
+	if os.path.isdir(Directory):
+		for FileName in os.listdir(Directory):
+			if FileName.endswith(".npz"):
+				os.remove(f"{Directory}{FileName}")
+	print("Result cache cleared!")
+
+# Small least recently used caches kept in memory for data worked out per take, Cache is a plain dict
+# NOTE Jobs fill them from the worker thread while the UI thread reads them, so every access goes through the lock
+gCachedValueLock = threading.Lock()
+
+def getCachedValue(Cache: dict, Key: tuple):
+	with gCachedValueLock:
+		if not Key in Cache:
+			return None
+		# Moved to the back so the least recently used one is always first in line to be dropped
+		Cache[Key] = Cache.pop(Key)
+		return Cache[Key]
+
+def setCachedValue(Cache: dict, Key: tuple, Data, MaxSize: int) -> None:
+	with gCachedValueLock:
+		Cache[Key] = Data
+		while len(Cache) > max(MaxSize, 0):
+			Cache.pop(next(iter(Cache)))
+
+# ----------------------------------------
+# [END] RESULT CACHE
+# ----------------------------------------
+
 # ----------------------------------------
 # [BEGIN] SAVING AND LOADING
 # ----------------------------------------
-	
-rigid_body_reference_file_name = f"{qtm.settings.directory.get_project_directory()}MocapMimicRigidBodyReference.json"
-skeleton_reference_file_name = f"{qtm.settings.directory.get_project_directory()}MocapMimicSkeletonReference.json"
-skeleton_reference_bones_file_name = f"{qtm.settings.directory.get_project_directory()}MocapMimicSkeletonBoneReference.json"
+
+# NOTE Fetched from QTM the first time it's needed and kept until the script is loaded again
+gProjectDirectory = None
+
+def getProjectDirectory() -> str:
+	global gProjectDirectory
+	if gProjectDirectory == None:
+		gProjectDirectory = qtm.settings.directory.get_project_directory()
+	return gProjectDirectory
+
+def getRigidBodyReferenceFileName() -> str:
+	return f"{getProjectDirectory()}MocapMimicRigidBodyReference.json"
+
+def getSkeletonReferenceFileName() -> str:
+	return f"{getProjectDirectory()}MocapMimicSkeletonReference.json"
+
+def getSkeletonBonesReferenceFileName() -> str:
+	return f"{getProjectDirectory()}MocapMimicSkeletonBoneReference.json"
 
 gSegments = []
 def addSegmentMarker() -> None:
@@ -322,11 +1053,24 @@ def saveSelectedRigidBodyAsReference() -> None:
 
 	rigid_body_data.update({"trajectories": rigid_body_trajectories})
 	rigid_body_data.update({"segments": segments})
-	
-	with open(rigid_body_reference_file_name, "w") as file:
-		json.dump(rigid_body_trajectories, file)
+	rigid_body_data.update({"frequency": qtm.gui.timeline.get_frequency()})
 
-	gSegments.clear()
+	selectedRigidBody = getSelectedRigidBodyID()
+	if selectedRigidBody != -1:
+		rigid_body_data.update({"pose": getRigidBodyPoseAsDict(selectedRigidBody, selected_range)})
+
+	# NOTE The file name comes from qtm, so it's worked out before the job starts
+	FileName = getRigidBodyReferenceFileName()
+
+	def Work(Job):
+		return writeReferenceFile(FileName, rigid_body_data)
+
+	def OnDone(ErrorOverBound):
+		reportCompressionFallback(FileName, ErrorOverBound)
+		print("Rigid body reference saved!")
+
+	if startBackgroundJob("Saving rigid body reference", Work, OnDone):
+		gSegments.clear()
 		
 def saveSelectedSkeletonAsReference() -> None:
 	global gSegments
@@ -345,9 +1089,7 @@ def saveSelectedSkeletonAsReference() -> None:
 
 	skeleton_trajectories_data.update({"trajectories": skeleton_trajectories})
 	skeleton_trajectories_data.update({"segments": segments})
-	
-	with open(skeleton_reference_file_name, "w") as file:
-		json.dump(skeleton_trajectories_data, file)
+	skeleton_trajectories_data.update({"frequency": qtm.gui.timeline.get_frequency()})
 
 	selectedSkeleton = getSelectedSkeletonID()
 
@@ -355,36 +1097,336 @@ def saveSelectedSkeletonAsReference() -> None:
 	Skeleton = getSkeletonAsDict(selectedSkeleton, selected_range)
 	SkeletonData.update({"skeleton": Skeleton})
 	SkeletonData.update({"segments": segments})
+	SkeletonData.update({"frequency": qtm.gui.timeline.get_frequency()})
 
-	with open(skeleton_reference_bones_file_name, "w") as file:
-		json.dump(SkeletonData, file)
+	# NOTE Everything has been fetched from QTM at this point, only the encoding and writing is left for the worker
+	FileNames = [getSkeletonReferenceFileName(), getSkeletonBonesReferenceFileName()]
 
-	gSegments.clear()
+	def Work(Job):
+		ErrorsOverBound = [writeReferenceFile(FileNames[0], skeleton_trajectories_data)]
+		reportJobProgress(Job, 0.5)
+		# NOTE The reference never changes, so its half of the comparison is done once here instead of on every compare
+		SkeletonData.update({"directions": getReferenceDirectionsData(Skeleton)})
+		ErrorsOverBound.append(writeReferenceFile(FileNames[1], SkeletonData))
+		return ErrorsOverBound
+
+	def OnDone(ErrorsOverBound):
+		for FileName, ErrorOverBound in zip(FileNames, ErrorsOverBound):
+			reportCompressionFallback(FileName, ErrorOverBound)
+		print("Skeleton reference saved!")
+
+	if startBackgroundJob("Saving skeleton reference", Work, OnDone):
+		gSegments.clear()
+
+# Saves the selected range of the selected skeleton as a take that can be loaded again outside of QTM
+def exportSelectedSkeletonAsTake(FileName: str = None) -> None:
+	selectedSkeleton = getSelectedSkeletonID()
+	if selectedSkeleton == -1:
+		print("No Skeleton Selected!")
+		return
+
+	if FileName == None:
+		TakeIndex = 0
+		while os.path.exists(f"{getProjectDirectory()}MocapMimicTake{TakeIndex}.json"):
+			TakeIndex += 1
+		FileName = f"{getProjectDirectory()}MocapMimicTake{TakeIndex}.json"
+
+	selected_range = qtm.gui.timeline.get_selected_range()
+	TakeData = {}
+	TakeData.update({"skeleton": getSkeletonAsDict(selectedSkeleton, selected_range)})
+	TakeData.update({"segments": getSegmentsAsRanges(getSegmentsInLocalRange(selected_range))})
+	TakeData.update({"frequency": qtm.gui.timeline.get_frequency()})
+
+	reportCompressionFallback(FileName, writeReferenceFile(FileName, TakeData))
+	print(f"Take exported to {FileName}")
 
 def getSkeletonBonesReferenceFromFile() -> dict[str]:
-	with open(skeleton_reference_bones_file_name, "r") as file:
-		skeleton = json.load(file)    
-		return skeleton
+	return readReferenceFile(getSkeletonBonesReferenceFileName())
 
 def getRigidBodyReferenceFromFile() -> dict[str]:
-	with open(rigid_body_reference_file_name, "r") as file:
-		rigid_body_trajectories = json.load(file)    
-		return rigid_body_trajectories
+	rigid_body_data = readReferenceFile(getRigidBodyReferenceFileName())
+	# NOTE Older references only stored the bare trajectories
+	if not "trajectories" in rigid_body_data:
+		rigid_body_data = {"trajectories": rigid_body_data, "segments": []}
+	return rigid_body_data
 
 def getSkeletonReferenceFromFile() -> dict[str]:
-	with open(skeleton_reference_file_name, "r") as file:
-		skeleton_trajectories = json.load(file)    
-		return skeleton_trajectories
+	return readReferenceFile(getSkeletonReferenceFileName())
 
 # ----------------------------------------
 # [END] SAVING AND LOADING
 # ----------------------------------------
 
+# ----------------------------------------
+# [BEGIN] STREAMING STATISTICS
+# ----------------------------------------
+
+# Per bone statistics that are gathered in a single pass and can be fed any number of frames at a time, so
+# chunked and real-time scoring can use them just as well as a whole take. The mean and variance use Welford's
+# method (merged a batch at a time with Chan's formula, which is just as stable) and the percentiles come from a
+# fixed size histogram over the range the scores can be in, so the memory use never grows with the take length.
+# Every segment gets its own accumulator that is fed the rows that fall inside it as they arrive, so the whole take
+# and all of its segments come out of the same single pass.
+statisticsHistogramBins: int = 2000
+statisticsRange = (-1.0, 1.0)
+bPrintStatistics = True
+
+# NOTE To be called in the QTM console
+def setPrintStatisticsEnabled(NewValue: bool):
+	global bPrintStatistics
+	bPrintStatistics = NewValue
+	print(f"bPrintStatistics: {NewValue}")
+
+# Segments are ranges of rows like {"start": 0, "end": 50}, each one gets statistics of its own under "Segments"
+def createStreamingStatistics(NumberOfColumns: int, segments: list[dict[str: int]] = None) -> dict[str: np.ndarray]:
+	return {
+		"Count": np.zeros(NumberOfColumns),
+		"Mean": np.zeros(NumberOfColumns),
+		"M2": np.zeros(NumberOfColumns),
+		"Min": np.full(NumberOfColumns, np.inf),
+		"Max": np.full(NumberOfColumns, -np.inf),
+		"Histogram": np.zeros((NumberOfColumns, statisticsHistogramBins), dtype=np.int64),
+		"Segments": [{"start": segment["start"], "end": segment["end"], "Statistics": createStreamingStatistics(NumberOfColumns)} for segment in (segments or [])],
+	}
+
+# Values is shaped (frames, columns), NaN values are skipped. FirstRow is the row the first of the values is
+# for, which is what decides the segments they go into
+def updateStreamingStatistics(Statistics: dict[str: np.ndarray], Values: np.ndarray, FirstRow: int = 0) -> None:
+	Values = np.asarray(Values, dtype=float).reshape(-1, len(Statistics["Count"]))
+	for Segment in Statistics["Segments"]:
+		Low = max(Segment["start"], FirstRow)
+		High = min(Segment["end"], FirstRow + len(Values))
+		if Low < High:
+			updateStreamingStatistics(Segment["Statistics"], Values[Low - FirstRow:High - FirstRow], Low)
+
+	Valid = ~np.isnan(Values)
+	BatchCount = Valid.sum(axis=0)
+	if not BatchCount.any():
+		return
+
+	Filled = np.where(Valid, Values, 0)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		BatchMean = np.where(BatchCount > 0, Filled.sum(axis=0) / BatchCount, 0)
+	BatchM2 = np.where(Valid, (Values - BatchMean) ** 2, 0).sum(axis=0)
+
+	# Chan's parallel version of Welford's update
+	Count = Statistics["Count"]
+	Total = Count + BatchCount
+	Delta = BatchMean - Statistics["Mean"]
+	with np.errstate(invalid="ignore", divide="ignore"):
+		Statistics["Mean"] = np.where(Total > 0, Statistics["Mean"] + Delta * BatchCount / Total, 0)
+		Statistics["M2"] = Statistics["M2"] + BatchM2 + np.where(Total > 0, Delta ** 2 * Count * BatchCount / Total, 0)
+	Statistics["Count"] = Total
+
+	Statistics["Min"] = np.minimum(Statistics["Min"], np.where(Valid, Values, np.inf).min(axis=0))
+	Statistics["Max"] = np.maximum(Statistics["Max"], np.where(Valid, Values, -np.inf).max(axis=0))
+
+	Low, High = statisticsRange
+	Bins = np.clip(np.floor((np.where(Valid, Values, Low) - Low) / (High - Low) * statisticsHistogramBins), 0, statisticsHistogramBins - 1).astype(np.int64)
+	Columns = np.broadcast_to(np.arange(Values.shape[1]), Values.shape)
+	Indices = (Columns * statisticsHistogramBins + Bins)[Valid]
+	Statistics["Histogram"] += np.bincount(Indices, minlength=Statistics["Histogram"].size).reshape(Statistics["Histogram"].shape)
+
+# Percentiles (0 - 100) read off the histogram, shaped (percentiles, columns)
+# NOTE They are accurate to one histogram bin, which is 0.001 for scores between -1 and 1
+def getStreamingPercentiles(Statistics: dict[str: np.ndarray], Percentiles: list[float]) -> np.ndarray:
+	Low, High = statisticsRange
+	BinWidth = (High - Low) / statisticsHistogramBins
+	Cumulative = np.cumsum(Statistics["Histogram"], axis=1)
+	Result = np.full((len(Percentiles), len(Statistics["Count"])), np.nan)
+	for p, Percentile in enumerate(Percentiles):
+		Target = np.maximum(np.ceil(Statistics["Count"] * Percentile / 100), 1)
+		Bins = (Cumulative < Target[:, None]).sum(axis=1)
+		Result[p] = np.where(Statistics["Count"] > 0, Low + (Bins + 0.5) * BinWidth, np.nan)
+	# The bin centre can land outside of what was actually seen
+	return np.clip(Result, Statistics["Min"], Statistics["Max"])
+
+# Structured like {"Hips": {"Mean": 0.9, "StdDev": 0.05, "Min": 0.7, "Max": 1.0, "P5": 0.8, "P50": 0.92, "P95": 0.99, "Count": 100}}
+def getStatisticsSummary(Statistics: dict[str: np.ndarray], Names: list[str]) -> dict[str: dict]:
+	Percentiles = getStreamingPercentiles(Statistics, [5, 50, 95])
+	with np.errstate(invalid="ignore", divide="ignore"):
+		Variance = np.where(Statistics["Count"] > 1, Statistics["M2"] / (Statistics["Count"] - 1), 0)
+
+	Summary = {}
+	for b, Name in enumerate(Names):
+		HasData = Statistics["Count"][b] > 0
+		Summary[Name] = {
+			"Mean": float(Statistics["Mean"][b]),
+			"StdDev": float(np.sqrt(Variance[b])),
+			"Min": float(Statistics["Min"][b]) if HasData else math.nan,
+			"Max": float(Statistics["Max"][b]) if HasData else math.nan,
+			"P5": float(Percentiles[0][b]),
+			"P50": float(Percentiles[1][b]),
+			"P95": float(Percentiles[2][b]),
+			"Count": int(Statistics["Count"][b]),
+		}
+	return Summary
+
+def printBoneStatistics(BoneStatistics: dict[str: dict]) -> None:
+	padding = max([len(key) for key in BoneStatistics] + [4])
+	Lines = [f"{'Bone':{padding}} |  Mean | StdDev |   Min |    P5 |   P50 |   P95 |   Max"]
+	# Least accurate first, same as the plain results
+	for key, val in sorted(BoneStatistics.items(), key=lambda item: item[1]["Mean"]):
+		Lines.append(f"{key:{padding}} | {val['Mean']:5.2f} | {val['StdDev']:6.3f} | {val['Min']:5.2f} | {val['P5']:5.2f} | {val['P50']:5.2f} | {val['P95']:5.2f} | {val['Max']:5.2f}")
+	PrintAsBox(Lines)
+
+# ----------------------------------------
+# [END] STREAMING STATISTICS
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] RESULT EXPORT
+# ----------------------------------------
+
+# Writes the per frame, per bone scores to disk so they can be processed outside of QTM. Every column goes into
+# its own raw little endian file that rows are appended to a block at a time. A JSON sidecar describes the columns
+# along with the offset, segments and statistics, which means the columns can be read without copying, e.g.
+# np.memmap(f"{Directory}/{column['file']}", dtype=column["dtype"], mode="r")
+# NOTE Only the chunked comparison streams rows out as they are scored. Every other comparison scores the whole
+# range in one go, so its table is written out from memory at the end of the job, still on the worker thread. If
+# anything goes wrong part way through, the sidecar is still written but with "incomplete": true
+bExportResults = False
+bExportResultsCSV = False
+
+# NOTE To be called in the QTM console
+def setExportResultsEnabled(NewValue: bool, WithCSV: bool = None):
+	global bExportResults
+	global bExportResultsCSV
+	bExportResults = NewValue
+	if WithCSV != None:
+		bExportResultsCSV = WithCSV
+	print(f"bExportResults: {bExportResults}, bExportResultsCSV: {bExportResultsCSV}")
+
+def getResultExportDirectory() -> str:
+	Directory = f"{getProjectDirectory()}MocapMimicResults/{time.strftime('%Y%m%d-%H%M%S')}"
+	# Several exports within the same second get a number after them
+	Index = 1
+	Unique = Directory
+	while os.path.exists(Unique):
+		Unique = f"{Directory}_{Index}"
+		Index += 1
+	return Unique
+
+# Metadata is anything else that should end up in the sidecar
+def openResultExport(Directory: str, BoneNames: list[str], Metadata: dict[str], WithCSV: bool = False) -> dict[str]:
+	os.makedirs(Directory, exist_ok=True)
+	Columns = [{"name": "Frame", "file": "frame.i32", "dtype": "<i4"}]
+	for b, boneName in enumerate(BoneNames):
+		Columns.append({"name": boneName, "file": f"bone_{b:03}.f32", "dtype": "<f4"})
+
+	Writer = {
+		"Directory": Directory,
+		"BoneNames": BoneNames,
+		"Columns": Columns,
+		"Files": [],
+		"CSV": None,
+		"Rows": 0,
+		"Metadata": dict(Metadata),
+	}
+
+	try:
+		for column in Columns:
+			Writer["Files"].append(open(f"{Directory}/{column['file']}", "wb"))
+		if WithCSV:
+			Writer["CSV"] = open(f"{Directory}/scores.csv", "w")
+			Writer["CSV"].write(",".join(["Frame"] + BoneNames) + "\n")
+	except BaseException:
+		closeResultExport(Writer, {"incomplete": True})
+		raise
+
+	return Writer
+
+# FrameScores is shaped (rows, bones), Frames are the take frames the rows belong to
+def writeResultExportRows(Writer: dict[str], Frames: np.ndarray, FrameScores: np.ndarray) -> None:
+	Frames = np.asarray(Frames, dtype="<i4")
+	Writer["Files"][0].write(Frames.tobytes())
+	Scores = np.asarray(FrameScores, dtype="<f4")
+	for b in range(len(Writer["BoneNames"])):
+		Writer["Files"][b + 1].write(np.ascontiguousarray(Scores[:, b]).tobytes())
+
+	if Writer["CSV"] != None:
+		np.savetxt(Writer["CSV"], np.column_stack([Frames, Scores]), delimiter=",", fmt=["%d"] + ["%.4f"] * Scores.shape[1])
+
+	Writer["Rows"] += len(Frames)
+
+# Extra is added to the metadata, for things that are only known once scoring is done (offset, statistics...)
+# Passing {"incomplete": True} marks an export that stopped part way
+# NOTE Doesn't print anything so that it can be called from a worker thread
+def closeResultExport(Writer: dict[str], Extra: dict[str] = None) -> None:
+	for file in Writer["Files"]:
+		file.close()
+	if Writer["CSV"] != None:
+		Writer["CSV"].close()
+
+	Sidecar = dict(Writer["Metadata"])
+	Sidecar.update({"incomplete": False})
+	if Extra != None:
+		Sidecar.update(Extra)
+	Sidecar.update({"rows": Writer["Rows"], "columns": Writer["Columns"]})
+
+	with open(f"{Writer['Directory']}/results.json", "w") as file:
+		json.dump(Sidecar, file, indent=1, default=getJSONValue)
+
+def getResultExportExtra(Result: dict[str]) -> dict[str]:
+	Extra = {"offset": Result["Offset"], "segments": Result["Segments"], "boneStatistics": Result.get("BoneStatistics", {})}
+	if "SegmentStatistics" in Result:
+		Extra.update({"segmentStatistics": Result["SegmentStatistics"]})
+	return Extra
+
+# For results that are already in memory (everything but the chunked comparison), written out a block at a time
+# Directory has to come from getResultExportDirectory on the UI thread, Frequency is the rate the result is at
+# NOTE Doesn't print anything so that it can be called from a worker thread, returns the directory it wrote to
+def exportComparisonResult(Result: dict[str], RangeStart: int, Frequency: float, Directory: str, Metadata: dict[str] = None, WithCSV: bool = False) -> str:
+	Metadata = dict(Metadata) if Metadata != None else {}
+	Metadata.update({"rangeStart": RangeStart, "frequency": Frequency})
+	Writer = openResultExport(Directory, Result["BoneNames"], Metadata, WithCSV)
+
+	Extra = {"incomplete": True}
+	try:
+		BlockSize = 10000
+		for Start in range(0, Result["NumberOfMeasurements"], BlockSize):
+			End = min(Start + BlockSize, Result["NumberOfMeasurements"])
+			writeResultExportRows(Writer, RangeStart + np.arange(Start, End), Result["FrameScores"][Start:End])
+		Extra = getResultExportExtra(Result)
+	finally:
+		closeResultExport(Writer, Extra)
+	return Writer["Directory"]
+
+# Sets the comparison up to write its result out at the end of Work if exporting is enabled, see exportFinishedResult
+# Has to be called on the UI thread
+def getResultExportSettings(Frequency: float, Metadata: dict[str]) -> dict[str]:
+	if not bExportResults:
+		return None
+	return {"Directory": getResultExportDirectory(), "Frequency": Frequency, "Metadata": Metadata, "WithCSV": bExportResultsCSV}
+
+# To be called at the end of Work, the directory ends up in the result so OnDone can report it
+def exportFinishedResult(Result: dict[str], RangeStart: int, ExportSettings: dict[str]) -> dict[str]:
+	if Result == None or ExportSettings == None:
+		return Result
+	Directory = exportComparisonResult(Result, RangeStart + Result["Offset"], ExportSettings["Frequency"], ExportSettings["Directory"], ExportSettings["Metadata"], ExportSettings["WithCSV"])
+	Result.update({"ExportDirectory": Directory})
+	return Result
+
+def printResultExportDirectory(Result: dict[str]) -> None:
+	if "ExportDirectory" in Result:
+		print(f"Results exported to {Result['ExportDirectory']}")
+
+def exportLastComparisonResult() -> None:
+	if not "Result" in gLastComparison:
+		print("Run a bone or 6DOF comparison first!")
+		return
+	Directory = exportComparisonResult(gLastComparison["Result"], gLastComparison["RangeStart"], qtm.gui.timeline.get_frequency(), getResultExportDirectory(), {"skeletonID": gLastComparison["SkeletonID"]}, bExportResultsCSV)
+	print(f"Results exported to {Directory}")
+
+# ----------------------------------------
+# [END] RESULT EXPORT
+# ----------------------------------------
+
 # ----------------------------------------
 # [BEGIN] COMPARING TRAJECTORIES
 # ----------------------------------------
 
-def compareTrajectories(base_trajectories, mimic_trajectories) -> float:
+def compareTrajectories(base_trajectories, mimic_trajectories, Job = None) -> float:
 	sumCorr = 0
 	
 	if len(base_trajectories) != len(mimic_trajectories):
@@ -393,10 +1435,12 @@ def compareTrajectories(base_trajectories, mimic_trajectories) -> float:
 
 	base_prefix = getPrefix(list(base_trajectories.keys()))
 	mimic_prefix = getPrefix(list(mimic_trajectories.keys()))
-	print(f"base_prefix: {base_prefix}\nmimic_prefix: {mimic_prefix}")
 	
 	# Iterate over all labels in the rigid body
-	for label, points in base_trajectories.items():
+	for labelIndex, (label, points) in enumerate(base_trajectories.items()):
+		if isJobCancelled(Job):
+			return None
+		reportJobProgress(Job, labelIndex / len(base_trajectories))
 
 		# NOTE This creates the matching label that the mimic trajectory ought to have
 		# It assumes that the trajectories are identically named aside from their prefix
@@ -427,31 +1471,50 @@ def compareTrajectories(base_trajectories, mimic_trajectories) -> float:
 
 	return accuracy
 
+# Has to be called on the UI thread, the comparison itself is done by a background job
+def startTrajectoryComparison(reference_trajectories, selected_trajectories) -> None:
+	if len(reference_trajectories) != len(selected_trajectories):
+		qtm.gui.message.add_message("Mocap Mimic: Reference capture and current capture are different sizes", "The reference capture saved to file has a different number of labels than the currently selected capture, they are probably different types of objects", "error")
+		return
+
+	print(f"base_prefix: {getPrefix(list(reference_trajectories.keys()))}\nmimic_prefix: {getPrefix(list(selected_trajectories.keys()))}")
+
+	def Work(Job):
+		CacheKey = getResultCacheKey(["trajectories", getTrajectoriesContentHash(reference_trajectories), getTrajectoriesContentHash(selected_trajectories)])
+		Cached = loadCachedResult(CacheKey)
+		if Cached != None:
+			return float(Cached["Accuracy"])
+
+		accuracy = compareTrajectories(reference_trajectories, selected_trajectories, Job)
+		if accuracy != None and not isJobCancelled(Job):
+			saveCachedResult(CacheKey, {"Accuracy": np.array(accuracy)})
+		return accuracy
+
+	def OnDone(accuracy):
+		qtm.gui.message.add_message(f"Mocap Mimic: Overall accuracy: {accuracy:.2f}", "", "info")
+		print(f"Overall accuracy: {accuracy:.2f}")
+
+	startBackgroundJob("Comparing trajectories", Work, OnDone)
+
 def compareSelectedRigidBodyAgainstReference() -> None:
 	selected_trajectories = getTrajectoriesFormatted(getSelectedRigidBodyTrajectoryIDs())
-	reference_trajectories = getRigidBodyReferenceFromFile()["trajectories"]
+	reference_trajectories = getReferenceAtFrequency(getRigidBodyReferenceFromFile(), qtm.gui.timeline.get_frequency())["trajectories"]
 
 	if len(selected_trajectories) == 0 or len(selected_trajectories) == 0:
 		qtm.gui.message.add_message("Mocap Mimic: No rigid bodies selected", "Must select a rigid body to deal with", "error")
 		return
 
-	accuracy = compareTrajectories(reference_trajectories, selected_trajectories)
-
-	qtm.gui.message.add_message(f"Mocap Mimic: Overall accuracy: {accuracy:.2f}", "", "info")
-	print(f"Overall accuracy: {accuracy:.2f}")
+	startTrajectoryComparison(reference_trajectories, selected_trajectories)
 
 def compareSelectedSkeletonAgainstReference() -> None:
 	selected_trajectories = getTrajectoriesFormatted(getSelectedSkeletonTrajectoryIDs())
-	reference_trajectories = getSkeletonReferenceFromFile()["trajectories"]
+	reference_trajectories = getReferenceAtFrequency(getSkeletonReferenceFromFile(), qtm.gui.timeline.get_frequency())["trajectories"]
 
 	if len(selected_trajectories) == 0 or len(selected_trajectories) == 0:
 		qtm.gui.message.add_message("Mocap Mimic: No skeleton selected", "Must select a skeleton to deal with", "error")
 		return
 
-	accuracy = compareTrajectories(reference_trajectories, selected_trajectories)
-	
-	qtm.gui.message.add_message(f"Mocap Mimic: Overall accuracy: {accuracy:.2f}", "", "info")
-	print(f"Overall accuracy: {accuracy:.2f}")
+	startTrajectoryComparison(reference_trajectories, selected_trajectories)
 
 bDoCoarsePass = False
 WindowPassResolution: int = 2
@@ -467,12 +1530,13 @@ def setWindowPassResolution(NewIndex: int):
 	WindowPassResolution = NewIndex
 	print(f"WindowPassResolution: {NewIndex}")
 
-def printSegmentedResults(Segments, SegmentedBoneData):
+# NOTE Frequency is the rate the segments are in, the current take's if it isn't given
+def printSegmentedResults(Segments, SegmentedBoneData, Frequency: float = None):
 	longestBoneName = 20
 	title = "Joint Name"
 	titleString = f"{title:{longestBoneName}}|"
 	sectionLengths = []
-	freq = qtm.gui.timeline.get_frequency()
+	freq = Frequency if Frequency != None else qtm.gui.timeline.get_frequency()
 	for i in range(len(Segments)):
 		tempString = f" Segment {i} ({Segments[i]['start'] * (1/freq):.2f}s - {Segments[i]['end'] * (1/freq):.2f}s) |"
 		sectionLengths.append(len(tempString) - 1)
@@ -503,7 +1567,139 @@ def printSegmentedResults(Segments, SegmentedBoneData):
 		print("| " + separatorString)
 	print("+-" + bufferString)
 
-def compareSelectedSkeletonBonesAgainstReference() -> None:
+# Puts the mimic's per bone columns (directions, positions, velocities...) in the same order as the reference's bones
+# Values is shaped (frames, bones, ...), returns None if the mimic is missing any of the bones
+def getColumnsInBoneOrder(BoneNames: list[str], MimicBoneNames: list[str], Values: np.ndarray) -> np.ndarray:
+	if not set(BoneNames).issubset(MimicBoneNames):
+		return None
+	return Values[:, [MimicBoneNames.index(name) for name in BoneNames]]
+
+# Dot product between the reference and the mimic shifted by Offset for every frame and bone, shaped (frames, bones)
+def getFrameBoneScores(RefDirections: np.ndarray, MimicDirections: np.ndarray, Offset: int) -> np.ndarray:
+	return np.einsum("fbi,fbi->fb", RefDirections, MimicDirections[Offset:Offset + len(RefDirections)])
+
+# Frames that are NaN (missing data) are left out, a column without any valid frames averages to 0
+def getColumnAverages(Scores: np.ndarray) -> np.ndarray:
+	Valid = ~np.isnan(Scores)
+	Counts = Valid.sum(axis=0)
+	return np.where(Valid, Scores, 0).sum(axis=0) / np.maximum(Counts, 1)
+
+# Tries every offset of the reference into the mimic and returns the one with the highest score
+# ScoreAtOffset(Offset, Resolution) scores every Resolution-th frame of the reference against the mimic starting at Offset
+def findBestOffset(ScoreAtOffset, Overshoot: int, Resolution: int = 1, Job = None) -> int:
+	Resolution = max(1, Resolution)
+	BestScore = -math.inf
+	BestOffset = 0
+	for Offset in range(Overshoot + 1):
+		if isJobCancelled(Job):
+			return None
+
+		Score = ScoreAtOffset(Offset, Resolution)
+		if Score > BestScore:
+			BestScore = Score
+			BestOffset = Offset
+
+		reportJobProgress(Job, (Offset + 1) / (Overshoot + 1))
+	return BestOffset
+
+# Turns the per frame scores into the averages that get printed, either per segment or over the whole thing
+# Statistics can be passed in if they were already gathered while scoring (like the chunked comparison does), they
+# have to have been created with the same segments. Otherwise they are gathered here in one pass over the scores
+def summarizeBoneScores(BoneNames: list[str], FrameScores: np.ndarray, Offset: int, segments, Statistics: dict[str: np.ndarray] = None) -> dict[str]:
+	Result = {"Offset": Offset, "Segments": segments, "NumberOfMeasurements": len(FrameScores), "BoneNames": BoneNames, "FrameScores": FrameScores}
+
+	if Statistics == None:
+		Statistics = createStreamingStatistics(len(BoneNames), segments)
+		updateStreamingStatistics(Statistics, FrameScores)
+	Result.update({"BoneStatistics": getStatisticsSummary(Statistics, BoneNames)})
+
+	# NOTE If segments exist, split up the evaluation
+	# The means skip missing frames and are 0 for a bone without any valid frames, same as getColumnAverages
+	if len(segments) > 0:
+		# Structured like {"Hips": [0.95, 0.584, 0.458], "Spine": [0.95, 0.584, 0.458]}
+		SegmentedBoneData = {boneName: [] for boneName in BoneNames}
+		SegmentStatistics = []
+		for Segment in Statistics["Segments"]:
+			for b, boneName in enumerate(BoneNames):
+				SegmentedBoneData[boneName].append(float(Segment["Statistics"]["Mean"][b]))
+			SegmentStatistics.append(getStatisticsSummary(Segment["Statistics"], BoneNames))
+		Result.update({"SegmentedBoneData": SegmentedBoneData})
+		Result.update({"SegmentStatistics": SegmentStatistics})
+
+	# NOTE If no segments exist, judge it in its entirety
+	else:
+		Result.update({"BoneData": {boneName: float(Statistics["Mean"][b]) for b, boneName in enumerate(BoneNames)}})
+
+	return Result
+
+# Does all of the number crunching for a bone comparison
+# The reference side comes in already worked out (see getReferenceDirections), only the mimic's directions are computed
+def compareSkeletonBones(BoneNames: list[str], RefDirections: np.ndarray, mimicSkeleton, segments, WorldAgnostic: bool, DoCoarsePass: bool, Resolution: int, Job = None) -> dict[str]:
+	# NOTE The segments aren't part of the key, they are applied to the cached per frame scores afterwards
+	# The mimic's content hash already covers which take and range it came from
+	Mode = "compareSkeletonPoseWorldAgnostic" if WorldAgnostic else "compareSkeletonPose"
+	CacheKey = getResultCacheKey(["bones", Mode, DoCoarsePass, Resolution if DoCoarsePass else 0, hashlib.sha1(np.ascontiguousarray(RefDirections).tobytes()).hexdigest(), getSkeletonContentHash(mimicSkeleton)])
+	Cached = loadCachedResult(CacheKey)
+	if Cached != None:
+		Result = summarizeBoneScores(Cached["BoneNames"].tolist(), Cached["FrameScores"], int(Cached["Offset"]), segments)
+		Result.update({"Cached": True})
+		return Result
+
+	MimicBoneNames, MimicDirections = getSkeletonJointDirections(mimicSkeleton, WorldAgnostic)
+	MimicDirections = getColumnsInBoneOrder(BoneNames, MimicBoneNames, MimicDirections)
+	if MimicDirections is None:
+		raise ValueError("The mimic skeleton doesn't have all of the reference's bones")
+
+	Overshoot: int = len(MimicDirections) - len(RefDirections)
+	numbersOfMeasurement = len(RefDirections)
+	MimicComparisonOffset = 0
+	if DoCoarsePass:
+		MimicComparisonOffset = findBestOffset(lambda j, Step: np.nansum(np.einsum("fbi,fbi->fb", RefDirections[::Step], MimicDirections[j:j + numbersOfMeasurement:Step])), Overshoot, Resolution, Job)
+		if MimicComparisonOffset == None:
+			return None
+
+	FrameScores = getFrameBoneScores(RefDirections, MimicDirections, MimicComparisonOffset)
+
+	saveCachedResult(CacheKey, {"BoneNames": np.array(BoneNames), "FrameScores": FrameScores, "Offset": np.array(MimicComparisonOffset)})
+
+	return summarizeBoneScores(BoneNames, FrameScores, MimicComparisonOffset, segments)
+
+def printBoneComparisonResults(Result: dict[str], selected_range: dict[str: int], DoCoarsePass: bool) -> None:
+	if DoCoarsePass:
+		# Set the measured range in QTM to the best chunk we found
+		NewRangeStart = selected_range["start"] + Result["Offset"]
+		NewRangeEnd = NewRangeStart + Result["NumberOfMeasurements"]
+		NewRange = {"start": NewRangeStart, "end": NewRangeEnd}
+
+		print(f"Setting range to: {NewRange}")
+		qtm.gui.timeline.set_selected_range(NewRange)
+
+	if Result.get("Cached", False):
+		print("Using cached comparison results")
+
+	if bPrintStatistics and "BoneStatistics" in Result:
+		printBoneStatistics(Result["BoneStatistics"])
+
+	if "SegmentedBoneData" in Result:
+		printSegmentedResults(Result["Segments"], Result["SegmentedBoneData"], Result.get("Frequency"))
+		return
+
+	BoneData = Result["BoneData"]
+	padding = 0
+	for key in BoneData:
+		padding = max(len(key), padding)
+
+	# Sorts the dict by the accuracy of the joint, least accurate first
+	BoneData = {k: v for k, v in sorted(BoneData.items(), key=lambda item: item[1])}
+
+	print("Bone accuracy (Sorted):")
+	for key, val in BoneData.items():
+		print(f"{key:{padding + 1}}: {val:.2f}")
+
+# Fetches everything from QTM up front and then hands the comparison over to a background job
+# AlignFacing turns the mimic to face the same way as the reference on every frame first, see FACING ALIGNMENT
+# Dynamics scores the joints' velocities and accelerations instead of the bone directions, see DYNAMICS
+def startSkeletonBonesComparison(WorldAgnostic: bool, AlignFacing: bool = False, Dynamics: bool = False) -> None:
 	global bDoCoarsePass
 	global WindowPassResolution
 
@@ -515,242 +1711,494 @@ def compareSelectedSkeletonBonesAgainstReference() -> None:
 		print("No Skeleton Selected!")
 		return
 
+	# NOTE The alignment and the derivatives need the whole range at once, so they always run unchunked
+	if bChunkedComparison and not AlignFacing and not Dynamics:
+		compareSelectedSkeletonBonesChunked(selectedSkeletonID, selected_range, WorldAgnostic)
+		return
+
 	mimicSkeleton = getSkeletonAsDict(selectedSkeletonID, selected_range)
-	referenceSkeleton = getSkeletonBonesReferenceFromFile()["skeleton"]
-	segments = getSkeletonBonesReferenceFromFile()["segments"]
+	reference = getSkeletonBonesReferenceFromFile()
+	segments = reference["segments"]
 	print(f"segments: {segments}")
-	
-	Overshoot: int = len(mimicSkeleton["Transforms"]) - len(referenceSkeleton["Transforms"])
+
+	# NOTE Both sides are brought to the same rate before anything is scored, see RESAMPLING
+	TakeFrequency = qtm.gui.timeline.get_frequency()
+	Frequency = getComparisonFrequency(TakeFrequency)
+	ReferenceFrequency = getCaptureFrequency(reference)
+	if not isSameFrequency(ReferenceFrequency, Frequency) or not isSameFrequency(TakeFrequency, Frequency):
+		print(f"Comparing at {Frequency} Hz (reference: {ReferenceFrequency} Hz, take: {TakeFrequency} Hz)")
+
+	Overshoot: int = getResampledLength(len(mimicSkeleton["Transforms"]), TakeFrequency, Frequency) - getResampledLength(len(reference["skeleton"]["Transforms"]), ReferenceFrequency, Frequency)
 
 	if Overshoot < 0:
 		print(f"Mimic must be at least as long as the reference! Need {-Overshoot} more samples")
 		return
 
-	BoneData = {}
-	numbersOfMeasurement = len(referenceSkeleton["Transforms"])
-	BestAverageScore = 0
-	MimicComparisonOffset = 0
-
-	print(f"Coarse Pass: {bDoCoarsePass}")
-
-	# Start of Coarse Pass
-	if bDoCoarsePass:
-		print(f"Resolution: {WindowPassResolution}")
-		for j in range(Overshoot):
-			for i in range(0, numbersOfMeasurement, WindowPassResolution):
-				TempBoneData = compareSkeletonPose(referenceSkeleton, mimicSkeleton, i, j)
-
-				if i == 0:
-					BoneData = TempBoneData
-					continue
-
-				for key in BoneData:
-					BoneData[key] += TempBoneData[key]
-			
-			AverageScore = sum(BoneData.values()) / len(BoneData)
-
-			if AverageScore > BestAverageScore:
-				BestAverageScore = AverageScore
-				MimicComparisonOffset = j
-
-		# Set the measured range in QTM to the best chunk we found
-		NewRangeStart = selected_range["start"] + MimicComparisonOffset
-		NewRangeEnd = NewRangeStart + numbersOfMeasurement
-		NewRange = {"start": NewRangeStart, "end": NewRangeEnd}
-
-		print(f"Setting range to: {NewRange}")
-		qtm.gui.timeline.set_selected_range(NewRange)
-	# End of Coarse Pass
-
-	# NOTE If segments exist, split up the evaluation
-	# TODO Add proper evalution
-	if len(segments) > 0:
-		# Structured like {"Hips": [0.95, 0.584, 0.458], "Spine": [0.95, 0.584, 0.458]}
-		SegmentedBoneData = {}
-		boneNames = getAllSkeletonBoneNames(referenceSkeleton)
-		for boneName in boneNames:
-			SegmentedBoneData.update({boneName: []})
-
-		for segment in segments:
-			print(segment)
-			SegmentComparisonData = {}
-			for i in range(segment["start"], segment["end"]):
-				TempBoneData = compareSkeletonPose(referenceSkeleton, mimicSkeleton, i, i + MimicComparisonOffset)
-
-				if i == segment["start"]:
-					SegmentComparisonData = TempBoneData
-					continue
+	# NOTE The settings are copied so that changing them from the console doesn't affect a running job
+	DoCoarsePass = bDoCoarsePass
+	Resolution = WindowPassResolution
+	YawOnly = bAlignYawOnly
+	print(f"Coarse Pass: {DoCoarsePass}")
+	if DoCoarsePass:
+		print(f"Resolution: {Resolution}")
+	if AlignFacing:
+		print(f"Aligning facing, yaw only: {YawOnly}")
+
+	ExportSettings = getResultExportSettings(TakeFrequency, {"skeletonID": selectedSkeletonID, "worldAgnostic": WorldAgnostic, "alignFacing": AlignFacing, "dynamics": Dynamics})
+
+	def Work(Job):
+		Reference = getReferenceAtFrequency(reference, Frequency, ReferenceFrequency)
+		Mimic = resampleSkeleton(mimicSkeleton, TakeFrequency, Frequency)
+		if Dynamics:
+			Result = compareSkeletonDynamics(Reference["skeleton"], Mimic, Reference["segments"], Frequency, DoCoarsePass, Resolution, Job)
+		elif AlignFacing:
+			Result = compareSkeletonBonesAligned(Reference["skeleton"], Mimic, Reference["segments"], YawOnly, DoCoarsePass, Resolution, Job)
+		else:
+			BoneNames, RefDirections = getReferenceDirections(Reference, WorldAgnostic)
+			Result = compareSkeletonBones(BoneNames, RefDirections, Mimic, Reference["segments"], WorldAgnostic, DoCoarsePass, Resolution, Job)
+		return exportFinishedResult(getResultAtFrequency(Result, Frequency, TakeFrequency, segments, ReferenceFrequency), selected_range["start"], ExportSettings)
 
-				for key in SegmentComparisonData:
-					SegmentComparisonData[key] += TempBoneData[key]
-			
-			# Calculate the average score over the period
-			periodSpan = segment["end"] - segment["start"]
-			for key in SegmentComparisonData:
-				SegmentComparisonData[key] /= periodSpan
+	def OnDone(Result):
+		setLastComparisonResult(Result, selected_range, selectedSkeletonID)
+		printBoneComparisonResults(Result, selected_range, DoCoarsePass)
+		if Dynamics:
+			printDynamicsResults(Result)
+		printResultExportDirectory(Result)
 
-			for key in SegmentedBoneData:
-				if not (key in SegmentedBoneData):
-					SegmentedBoneData[key].update({key: [SegmentComparisonData[key]]})
-				else:
-					SegmentedBoneData[key].append(SegmentComparisonData[key])
+	startBackgroundJob("Comparing skeleton bones", Work, OnDone)
 
-		
-		# Some weird logic to make the output look a bit prettier
-		# TODO setting this to a constant value is bad, but I'm too lazy to actually iterate over the array
-		printSegmentedResults(segments, SegmentedBoneData)
+def compareSelectedSkeletonBonesAgainstReference() -> None:
+	startSkeletonBonesComparison(False)
 
-	# NOTE If no segments exist, judge it in its entirety
-	else:
-		for i in range(numbersOfMeasurement):
-			TempBoneData = compareSkeletonPose(referenceSkeleton, mimicSkeleton, i, i + MimicComparisonOffset)
+def compareSelectedSkeletonBonesAgainstReferenceWorldAgnostic() -> None:
+	startSkeletonBonesComparison(True)
 
-			if i == 0:
-				BoneData = TempBoneData
-				continue
+# ----------------------------------------
+# [END] COMPARING TRAJECTORIES
+# ----------------------------------------
 
-			for key in BoneData:
-				BoneData[key] += TempBoneData[key]
+# ----------------------------------------
+# [BEGIN] CHUNKED COMPARISON
+# ----------------------------------------
 
-		padding = 0
-		for key in BoneData:
-			padding = max(len(key), padding)
+# For takes that are too long to pull into memory in one go. The mimic is fetched a chunk of frames at a time
+# and only the reference and a single chunk are ever held at once. For the coarse pass every chunk adds its part
+# of the score of every offset it overlaps (a full cross correlation against the reference), so the running
+# per offset sums are the only thing carried from one chunk to the next. The chunks can sit right next to each
+# other because those sums add up exactly.
+# NOTE Fetching from QTM has to happen on the UI thread, so the job queues the chunks up through postToUIThread and
+# does everything else on the worker. The next chunk is always asked for before the current one gets scored, so a
+# single pump fetches as many chunks as fit in uiRequestBudgetInMs and at most two chunks are held at once
+# The mimic is streamed at the take's rate, comparisonFrequency only applies to the unchunked comparisons
+bChunkedComparison = False
+chunkSizeInFrames: int = 2000
 
-		# Sorts the dict by the accuracy of the joint, least accurate first
-		BoneData = {k: v for k, v in sorted(BoneData.items(), key=lambda item: item[1])}
+# NOTE To be called in the QTM console
+def setChunkedComparisonEnabled(NewValue: bool):
+	global bChunkedComparison
+	bChunkedComparison = NewValue
+	print(f"bChunkedComparison: {NewValue}")
+
+def setChunkSizeInFrames(NewValue: int):
+	global chunkSizeInFrames
+	chunkSizeInFrames = NewValue
+	print(f"chunkSizeInFrames: {NewValue}")
+
+# Full cross correlation between the reference and a chunk of the mimic, summed over every bone
+# Entry k is the score of the reference starting k - (len(RefDirections) - 1) frames after the start of the chunk
+def getChunkCorrelation(RefDirections: np.ndarray, ChunkDirections: np.ndarray) -> np.ndarray:
+	RefLength = len(RefDirections)
+	ChunkLength = len(ChunkDirections)
+	FFTLength = 1 << int(math.ceil(math.log2(RefLength + ChunkLength)))
+
+	Ref = np.nan_to_num(RefDirections)
+	Chunk = np.nan_to_num(ChunkDirections)
+	Correlation = np.zeros(FFTLength // 2 + 1, dtype=complex)
+	for b in range(Ref.shape[1]):
+		Correlation += (np.fft.rfft(Chunk[:, b], FFTLength, axis=0) * np.conj(np.fft.rfft(Ref[:, b], FFTLength, axis=0))).sum(axis=1)
+	Circular = np.fft.irfft(Correlation, FFTLength)
+
+	# Negative shifts wrapped around to the end
+	return np.concatenate([Circular[FFTLength - (RefLength - 1):], Circular[:ChunkLength]]) if RefLength > 1 else Circular[:ChunkLength]
+
+# QTM's ranges might include the end frame or not, a one frame range is fetched to find out how many extra frames
+# a range gives back, so the chunks cover exactly the frames the unchunked comparison gets from the same selection
+def getRangeEndExtra(SkeletonID: int, Start: int) -> int:
+	RootID = qtm.data.object.skeleton.get_skeleton_root_id(SkeletonID)
+	return len(qtm.data.series.skeleton.get_samples(RootID, {"start": Start, "end": Start + 1})) - 1
+
+def requestChunk(SkeletonID: int, Start: int, End: int, RangeEndExtra: int, Job = None) -> dict[str]:
+	return postToUIThread(Job, getSkeletonAsDict, SkeletonID, {"start": Start, "end": End - RangeEndExtra})
+
+# Chunks is a list of (Start, End) frames relative to RangeStart, yields (Start, End, ChunkDirections) for each
+# of them in order
+# NOTE Stops early if the job gets cancelled, so the caller has to check for that after the loop
+def iterateChunkDirections(SkeletonID: int, RangeStart: int, Chunks: list[tuple[int, int]], RangeEndExtra: int, BoneNames: list[str], WorldAgnostic: bool, Job = None):
+	if len(Chunks) == 0:
+		return
+	Pending = requestChunk(SkeletonID, RangeStart + Chunks[0][0], RangeStart + Chunks[0][1], RangeEndExtra, Job)
+	for i, (Start, End) in enumerate(Chunks):
+		ChunkSkeleton = waitForUIThread(Job, Pending)
+		if isJobCancelled(Job):
+			return
+		if i + 1 < len(Chunks):
+			Pending = requestChunk(SkeletonID, RangeStart + Chunks[i + 1][0], RangeStart + Chunks[i + 1][1], RangeEndExtra, Job)
+
+		MimicBoneNames, MimicDirections = getSkeletonJointDirections(ChunkSkeleton, WorldAgnostic)
+		ChunkDirections = getColumnsInBoneOrder(BoneNames, MimicBoneNames, MimicDirections)
+		if ChunkDirections is None:
+			raise ValueError("The mimic skeleton doesn't have all of the reference's bones")
+		if len(ChunkDirections) != End - Start:
+			raise ValueError(f"Got {len(ChunkDirections)} frames for frames {Start} - {End} from QTM, expected {End - Start}")
+		yield Start, End, ChunkDirections
+
+def getChunks(Length: int, ChunkSize: int) -> list[tuple[int, int]]:
+	return [(ChunkStart, min(ChunkStart + ChunkSize, Length)) for ChunkStart in range(0, Length, ChunkSize)]
+
+def compareSelectedSkeletonBonesChunked(SkeletonID: int, selected_range: dict[str: int], WorldAgnostic: bool) -> None:
+	# NOTE The mimic is streamed straight from QTM, so only the reference is resampled and it's always to the take's rate
+	Frequency = qtm.gui.timeline.get_frequency()
+	reference = getReferenceAtFrequency(getSkeletonBonesReferenceFromFile(), Frequency)
+	segments = reference["segments"]
+	BoneNames, RefDirections = getReferenceDirections(reference, WorldAgnostic)
+	RefLength = len(RefDirections)
+
+	RangeEndExtra = getRangeEndExtra(SkeletonID, selected_range["start"])
+	TakeLength = selected_range["end"] - selected_range["start"] + RangeEndExtra
+	Overshoot: int = TakeLength - RefLength
+	if Overshoot < 0:
+		print(f"Mimic must be at least as long as the reference! Need {-Overshoot} more samples")
+		return
 
-		print("Bone accuracy (Sorted):")
-		for key, val in BoneData.items():
-			val /= numbersOfMeasurement
-			print(f"{key:{padding + 1}}: {val:.2f}")
+	ChunkSize = max(1, chunkSizeInFrames)
+	DoCoarsePass = bDoCoarsePass
+	Resolution = max(1, WindowPassResolution)
+	ExportDirectory = getResultExportDirectory() if bExportResults else None
+	ExportResultsCSV = bExportResultsCSV
+	print(f"Chunked comparison, chunk size: {ChunkSize}, Coarse Pass: {DoCoarsePass}")
+	if DoCoarsePass:
+		print(f"Resolution: {Resolution}")
+	if getComparisonFrequency(Frequency) != Frequency:
+		print(f"comparisonFrequency is ignored by the chunked comparison, comparing at the take's {Frequency} Hz")
+
+	def Work(Job):
+		MimicComparisonOffset = 0
+		# NOTE The coarse pass goes over the whole take and the scoring only over the reference's length
+		TotalFrames = (TakeLength if DoCoarsePass else 0) + RefLength
+		if DoCoarsePass:
+			# The sum of the scores for every offset, this is all that's kept between chunks
+			OffsetScores = np.zeros(Overshoot + 1)
+			# NOTE Only every Resolution-th reference frame counts, same as findBestOffset in the unchunked comparison
+			SampledRef = np.zeros_like(RefDirections)
+			SampledRef[::Resolution] = RefDirections[::Resolution]
+			for ChunkStart, ChunkEnd, ChunkDirections in iterateChunkDirections(SkeletonID, selected_range["start"], getChunks(TakeLength, ChunkSize), RangeEndExtra, BoneNames, WorldAgnostic, Job):
+				Correlation = getChunkCorrelation(SampledRef, ChunkDirections)
+				# Offsets that this chunk contributes to, clipped to the ones that are actually valid
+				FirstOffset = ChunkStart - (RefLength - 1)
+				Low = max(FirstOffset, 0)
+				High = min(ChunkEnd - 1, Overshoot)
+				if Low <= High:
+					OffsetScores[Low:High + 1] += Correlation[Low - FirstOffset:High - FirstOffset + 1]
+				reportJobProgress(Job, ChunkEnd / TotalFrames)
+			if isJobCancelled(Job):
+				return None
+
+			MimicComparisonOffset = int(np.argmax(OffsetScores))
+
+		# Scores the reference against the chosen part of the mimic, one chunk at a time
+		FrameScores = np.empty((RefLength, len(BoneNames)))
+		Statistics = createStreamingStatistics(len(BoneNames), segments)
+		MimicStart = selected_range["start"] + MimicComparisonOffset
+		# NOTE Every chunk is written out as soon as it's scored
+		Writer = None
+		if ExportDirectory != None:
+			Writer = openResultExport(ExportDirectory, BoneNames, {"skeletonID": SkeletonID, "worldAgnostic": WorldAgnostic, "rangeStart": MimicStart, "frequency": Frequency}, ExportResultsCSV)
+
+		# Anything that stops it part way (cancelling included) leaves the export marked as incomplete
+		ExportExtra = {"incomplete": True}
+		try:
+			for ChunkStart, ChunkEnd, ChunkDirections in iterateChunkDirections(SkeletonID, MimicStart, getChunks(RefLength, ChunkSize), RangeEndExtra, BoneNames, WorldAgnostic, Job):
+				FrameScores[ChunkStart:ChunkEnd] = np.einsum("fbi,fbi->fb", RefDirections[ChunkStart:ChunkEnd], ChunkDirections)
+				updateStreamingStatistics(Statistics, FrameScores[ChunkStart:ChunkEnd], ChunkStart)
+				if Writer != None:
+					writeResultExportRows(Writer, MimicStart + np.arange(ChunkStart, ChunkEnd), FrameScores[ChunkStart:ChunkEnd])
+				reportJobProgress(Job, (TotalFrames - RefLength + ChunkEnd) / TotalFrames)
+			if isJobCancelled(Job):
+				return None
+
+			Result = summarizeBoneScores(BoneNames, FrameScores, MimicComparisonOffset, segments, Statistics)
+			ExportExtra = getResultExportExtra(Result)
+		finally:
+			if Writer != None:
+				closeResultExport(Writer, ExportExtra)
+
+		if Writer != None:
+			Result.update({"ExportDirectory": Writer["Directory"]})
+		return Result
+
+	def OnDone(Result):
+		setLastComparisonResult(Result, selected_range, SkeletonID)
+		printBoneComparisonResults(Result, selected_range, DoCoarsePass)
+		printResultExportDirectory(Result)
+
+	startBackgroundJob("Comparing skeleton bones (chunked)", Work, OnDone)
 
-	# qtm.gui.message.add_message(f"Mocap Mimic: Overall accuracy: {accuracy * 100:.2f}%", "", "info")
-	# print(f"Overall accuracy: {accuracy * 100:.2f}%")
+# ----------------------------------------
+# [END] CHUNKED COMPARISON
+# ----------------------------------------
 
-def compareSelectedSkeletonBonesAgainstReferenceWorldAgnostic() -> None:
-	global bDoCoarsePass
-	global WindowPassResolution
+# ----------------------------------------
+# [BEGIN] RIGID BODY POSES
+# ----------------------------------------
 
+# Compares the 6DOF pose of a rigid body instead of every single marker. The translation is scored the same way
+# as the trajectories are (direction of the frame to frame movement) and the rotation is scored by how far apart
+# the rotations relative to the first frame are. Everything is done on whole arrays so the cost doesn't depend
+# on how many markers the rigid body has.
+
+def poseToPositionsAndRotations(Pose: dict[str]):
+	Values = poseToArray(Pose)
+	return Values[:, :3], Values[:, 3:].reshape(-1, 3, 3)
+
+# Returns the per frame scores shaped (frames - 1, 2), translation first and rotation second
+# Frames with missing samples are NaN
+def getPoseFrameScores(RefPositions: np.ndarray, RefRotations: np.ndarray, MimicPositions: np.ndarray, MimicRotations: np.ndarray) -> np.ndarray:
+	RefDelta = np.diff(RefPositions, axis=0)
+	MimicDelta = np.diff(MimicPositions, axis=0)
+	RefLength = np.linalg.norm(RefDelta, axis=1)
+	MimicLength = np.linalg.norm(MimicDelta, axis=1)
+
+	with np.errstate(invalid="ignore", divide="ignore"):
+		Corr = np.einsum("ij,ij->i", RefDelta, MimicDelta) / (RefLength * MimicLength)
+	# NOTE Both standing still counts as a perfect match, just like in compareTrajectories
+	Corr[(RefLength == 0) & (MimicLength == 0)] = 1
+	Corr[((RefLength == 0) ^ (MimicLength == 0))] = 0
+	TranslationScores = np.maximum(0, Corr)
+
+	# Rotation of every frame relative to the first valid one, so the heading the body started at doesn't matter
+	RefRelative = np.einsum("ji,fjk->fik", RefRotations[getFirstValidFrame(RefRotations)], RefRotations)
+	MimicRelative = np.einsum("ji,fjk->fik", MimicRotations[getFirstValidFrame(MimicRotations)], MimicRotations)
+	# trace(A^T B) = 1 + 2cos(angle between A and B), mapped so that 1 is identical and 0 is turned 180 degrees
+	CosAngle = np.clip((np.einsum("fij,fij->f", RefRelative, MimicRelative) - 1) / 2, -1, 1)
+	RotationScores = (1 + CosAngle) / 2
+
+	return np.stack([TranslationScores, RotationScores[1:]], axis=1)
+
+def getFirstValidFrame(Values: np.ndarray) -> int:
+	Valid = np.flatnonzero(~np.isnan(Values.reshape(len(Values), -1)).any(axis=1))
+	return Valid[0] if len(Valid) > 0 else 0
+
+def compareRigidBodyPoses(ReferencePose: dict[str], MimicPose: dict[str], segments, DoCoarsePass: bool, Job = None) -> dict[str]:
+	ScoreNames = ["Translation", "Rotation"]
+	CacheKey = getResultCacheKey(["pose", DoCoarsePass, hashlib.sha1(poseToArray(ReferencePose).tobytes()).hexdigest(), hashlib.sha1(poseToArray(MimicPose).tobytes()).hexdigest()])
+	Cached = loadCachedResult(CacheKey)
+	if Cached != None:
+		Result = summarizeBoneScores(ScoreNames, Cached["FrameScores"], int(Cached["Offset"]), segments)
+		Result.update({"Cached": True})
+		return Result
+
+	RefPositions, RefRotations = poseToPositionsAndRotations(ReferencePose)
+	MimicPositions, MimicRotations = poseToPositionsAndRotations(MimicPose)
+	numbersOfMeasurement = len(RefPositions)
+	Overshoot = len(MimicPositions) - numbersOfMeasurement
+
+	def getOffsetScore(j: int, Step: int) -> float:
+		FrameScores = getPoseFrameScores(RefPositions, RefRotations, MimicPositions[j:j + numbersOfMeasurement], MimicRotations[j:j + numbersOfMeasurement])
+		return np.nanmean(FrameScores) if not np.isnan(FrameScores).all() else 0
+
+	Offset = 0
+	if DoCoarsePass:
+		Offset = findBestOffset(getOffsetScore, Overshoot, 1, Job)
+		if Offset == None:
+			return None
+
+	FrameScores = getPoseFrameScores(RefPositions, RefRotations, MimicPositions[Offset:Offset + numbersOfMeasurement], MimicRotations[Offset:Offset + numbersOfMeasurement])
+	# NOTE The scores are for the movement between frames, the last frame repeats the one before so the segments line up
+	FrameScores = np.concatenate([FrameScores, FrameScores[-1:]]) if len(FrameScores) > 0 else np.zeros((numbersOfMeasurement, 2))
+
+	saveCachedResult(CacheKey, {"FrameScores": FrameScores, "Offset": np.array(Offset)})
+
+	# Missing frames are left out of the averages
+	return summarizeBoneScores(ScoreNames, FrameScores, Offset, segments)
+
+def compareSelectedRigidBodyPoseAgainstReference() -> None:
 	selected_range = qtm.gui.timeline.get_selected_range()
-	print(f"Selected Range: {selected_range}")
-	selectedSkeletonID = getSelectedSkeletonID()
+	selectedRigidBodyID = getSelectedRigidBodyID()
 
-	if selectedSkeletonID == -1:
-		print("No Skeleton Selected!")
+	if selectedRigidBodyID == -1:
+		qtm.gui.message.add_message("Mocap Mimic: No rigid bodies selected", "Must select a rigid body to deal with", "error")
 		return
 
-	mimicSkeleton = getSkeletonAsDict(selectedSkeletonID, selected_range)
-	referenceSkeleton = getSkeletonBonesReferenceFromFile()["skeleton"]
-	segments = getSkeletonBonesReferenceFromFile()["segments"]
-	print(f"segments: {segments}")
-	
-	Overshoot: int = len(mimicSkeleton["Transforms"]) - len(referenceSkeleton["Transforms"])
+	reference = getRigidBodyReferenceFromFile()
+	if not "pose" in reference:
+		qtm.gui.message.add_message("Mocap Mimic: Reference has no 6DOF data", "Save the rigid body as a reference again to be able to compare 6DOF poses", "error")
+		return
 
+	reference = getReferenceAtFrequency(reference, qtm.gui.timeline.get_frequency())
+	ReferencePose = reference["pose"]
+	MimicPose = getRigidBodyPoseAsDict(selectedRigidBodyID, selected_range)
+	segments = reference["segments"]
+
+	Overshoot = len(MimicPose["Positions"]) - len(ReferencePose["Positions"])
 	if Overshoot < 0:
 		print(f"Mimic must be at least as long as the reference! Need {-Overshoot} more samples")
 		return
 
-	BoneData = {}
-	numbersOfMeasurement = len(referenceSkeleton["Transforms"])
-	BestAverageScore = 0
-	MimicComparisonOffset = 0
+	DoCoarsePass = bDoCoarsePass
+	print(f"Coarse Pass: {DoCoarsePass}")
 
-	print(f"Coarse Pass: {bDoCoarsePass}")
+	ExportSettings = getResultExportSettings(qtm.gui.timeline.get_frequency(), {"rigidBodyID": selectedRigidBodyID})
 
-	# Start of Coarse Pass
-	if bDoCoarsePass:
-		print(f"Resolution: {WindowPassResolution}")
-		for j in range(Overshoot):
-			for i in range(0, numbersOfMeasurement, WindowPassResolution):
-				TempBoneData = compareSkeletonPoseWorldAgnostic(referenceSkeleton, mimicSkeleton, i, j)
+	def Work(Job):
+		return exportFinishedResult(compareRigidBodyPoses(ReferencePose, MimicPose, segments, DoCoarsePass, Job), selected_range["start"], ExportSettings)
 
-				if i == 0:
-					BoneData = TempBoneData
-					continue
+	def OnDone(Result):
+		setLastComparisonResult(Result, selected_range)
+		printBoneComparisonResults(Result, selected_range, DoCoarsePass)
+		printResultExportDirectory(Result)
 
-				for key in BoneData:
-					BoneData[key] += TempBoneData[key]
-			
-			AverageScore = sum(BoneData.values()) / len(BoneData)
-
-			if AverageScore > BestAverageScore:
-				BestAverageScore = AverageScore
-				MimicComparisonOffset = j
+	startBackgroundJob("Comparing rigid body poses", Work, OnDone)
 
-		# Set the measured range in QTM to the best chunk we found
-		NewRangeStart = selected_range["start"] + MimicComparisonOffset
-		NewRangeEnd = NewRangeStart + numbersOfMeasurement
-		NewRange = {"start": NewRangeStart, "end": NewRangeEnd}
+# ----------------------------------------
+# [END] RIGID BODY POSES
+# ----------------------------------------
 
-		print(f"Setting range to: {NewRange}")
-		qtm.gui.timeline.set_selected_range(NewRange)
-	# End of Coarse Pass
+# ----------------------------------------
+# [BEGIN] SIMILARITY TIMELINE
+# ----------------------------------------
 
-	# NOTE If segments exist, split up the evaluation
-	# TODO Add proper evalution
-	if len(segments) > 0:
-		# Structured like {"Hips": [0.95, 0.584, 0.458], "Spine": [0.95, 0.584, 0.458]}
-		SegmentedBoneData = {}
-		boneNames = getAllSkeletonBoneNames(referenceSkeleton)
-		for boneName in boneNames:
-			SegmentedBoneData.update({boneName: []})
-
-		for segment in segments:
-			print(segment)
-			SegmentComparisonData = {}
-			for i in range(segment["start"], segment["end"]):
-				TempBoneData = compareSkeletonPoseWorldAgnostic(referenceSkeleton, mimicSkeleton, i, i + MimicComparisonOffset)
-
-				if i == segment["start"]:
-					SegmentComparisonData = TempBoneData
-					continue
+# Turns the per frame scores of the last comparison into a similarity curve per bone and overall, smoothed with
+# a sliding window. The cumulative sum is taken once and every window size is read straight out of it, so asking
+# for more windows doesn't mean more passes over the take.
+timelineWindowsInSeconds: list[float] = [0.25]
+timelineEventCount: int = 5
+# Only dips that go below this score get marked, so a take that matches well everywhere doesn't get any events
+timelineDipThreshold: float = 0.9
 
-				for key in SegmentComparisonData:
-					SegmentComparisonData[key] += TempBoneData[key]
-			
-			# Calculate the average score over the period
-			periodSpan = segment["end"] - segment["start"]
-			for key in SegmentComparisonData:
-				SegmentComparisonData[key] /= periodSpan
+# Structured like {"Result": {...}, "RangeStart": 120, "SkeletonID": 1}, RangeStart is the take frame the first score belongs to
+gLastComparison = {}
 
-			for key in SegmentedBoneData:
-				if not (key in SegmentedBoneData):
-					SegmentedBoneData[key].update({key: [SegmentComparisonData[key]]})
-				else:
-					SegmentedBoneData[key].append(SegmentComparisonData[key])
+# NOTE To be called in the QTM console
+def setTimelineWindowsInSeconds(NewValue: list[float]):
+	global timelineWindowsInSeconds
+	timelineWindowsInSeconds = list(NewValue) if isinstance(NewValue, (list, tuple)) else [NewValue]
+	print(f"timelineWindowsInSeconds: {timelineWindowsInSeconds}")
+
+def setTimelineEventCount(NewValue: int):
+	global timelineEventCount
+	timelineEventCount = NewValue
+	print(f"timelineEventCount: {NewValue}")
+
+def setTimelineDipThreshold(NewValue: float):
+	global timelineDipThreshold
+	timelineDipThreshold = NewValue
+	print(f"timelineDipThreshold: {NewValue}")
+
+# SkeletonID is only known for skeleton comparisons, it's what the heatmap gets drawn on
+def setLastComparisonResult(Result: dict[str], selected_range: dict[str: int], SkeletonID: int = None) -> None:
+	global gLastComparison
+	gLastComparison = {"Result": Result, "RangeStart": selected_range["start"] + Result["Offset"], "SkeletonID": SkeletonID}
+
+# Adds the overall score (average over all bones) as the last column
+def getScoresWithOverall(FrameScores: np.ndarray) -> np.ndarray:
+	Valid = ~np.isnan(FrameScores)
+	Overall = np.where(Valid, FrameScores, 0).sum(axis=1) / np.maximum(Valid.sum(axis=1), 1)
+	Overall[~Valid.any(axis=1)] = np.nan
+	return np.column_stack([FrameScores, Overall])
+
+# Centered moving average for every window size (in frames) at once, missing frames are left out of the average
+# Returns {WindowSize: array shaped like Scores}
+def getSmoothedScores(Scores: np.ndarray, WindowSizes: list[int]) -> dict[int: np.ndarray]:
+	Valid = ~np.isnan(Scores)
+	Zeros = np.zeros((1, Scores.shape[1]))
+	SumTable = np.concatenate([Zeros, np.cumsum(np.where(Valid, Scores, 0), axis=0)])
+	CountTable = np.concatenate([Zeros, np.cumsum(Valid, axis=0)])
+
+	Frames = np.arange(len(Scores))
+	Smoothed = {}
+	for WindowSize in WindowSizes:
+		WindowSize = max(1, int(WindowSize))
+		Starts = np.clip(Frames - WindowSize // 2, 0, len(Scores))
+		Ends = np.clip(Starts + WindowSize, 0, len(Scores))
+		Counts = CountTable[Ends] - CountTable[Starts]
+		with np.errstate(invalid="ignore", divide="ignore"):
+			Smoothed[WindowSize] = np.where(Counts > 0, (SumTable[Ends] - SumTable[Starts]) / Counts, np.nan)
+	return Smoothed
+
+def getTimelineWindowSizes(Frequency: float) -> list[int]:
+	return [max(1, int(round(Window * Frequency))) for Window in timelineWindowsInSeconds]
+
+# Picks the lowest local minima of the curve, no two of them closer than MinDistance frames
+def getWorstDips(Curve: np.ndarray, Count: int, MinDistance: int, Threshold: float = math.inf) -> list[int]:
+	Filled = np.where(np.isnan(Curve), np.inf, Curve)
+	Padded = np.concatenate([[np.inf], Filled, [np.inf]])
+	IsMinimum = (Padded[1:-1] <= Padded[:-2]) & (Padded[1:-1] <= Padded[2:]) & np.isfinite(Filled) & (Filled < Threshold)
+	Candidates = np.flatnonzero(IsMinimum)
+	Candidates = Candidates[np.argsort(Filled[Candidates], kind="stable")]
+
+	Dips = []
+	for Candidate in Candidates:
+		if len(Dips) >= Count:
+			break
+		if all(abs(Candidate - Dip) >= MinDistance for Dip in Dips):
+			Dips.append(int(Candidate))
+	return Dips
+
+def getLastComparisonTimeline():
+	if not "Result" in gLastComparison:
+		print("Run a bone or 6DOF comparison first!")
+		return None
+	Result = gLastComparison["Result"]
+	Frequency = qtm.gui.timeline.get_frequency()
+	WindowSizes = getTimelineWindowSizes(Frequency)
+	Smoothed = getSmoothedScores(getScoresWithOverall(Result["FrameScores"]), WindowSizes)
+	return Result, Frequency, WindowSizes, Smoothed
+
+def exportSimilarityTimeline(FileName: str = None) -> None:
+	Timeline = getLastComparisonTimeline()
+	if Timeline == None:
+		return
+	Result, Frequency, WindowSizes, Smoothed = Timeline
 
-		
-		printSegmentedResults(segments, SegmentedBoneData)
+	if FileName == None:
+		FileName = f"{getProjectDirectory()}MocapMimicTimeline"
 
-	# NOTE If no segments exist, judge it in its entirety
-	else:
-		for i in range(numbersOfMeasurement):
-			TempBoneData = compareSkeletonPoseWorldAgnostic(referenceSkeleton, mimicSkeleton, i, i + MimicComparisonOffset)
+	Names = Result["BoneNames"] + ["Overall"]
+	Frames = gLastComparison["RangeStart"] + np.arange(Result["NumberOfMeasurements"])
 
-			if i == 0:
-				BoneData = TempBoneData
-				continue
+	# Binary version, one float32 array per window shaped (frames, bones + 1)
+	np.savez_compressed(f"{FileName}.npz", Frames=Frames, Names=np.array(Names), Frequency=np.array(Frequency), **{f"Window{WindowSize}": Curve.astype(np.float32) for WindowSize, Curve in Smoothed.items()})
 
-			for key in BoneData:
-				BoneData[key] += TempBoneData[key]
+	Columns = [Frames.astype(float), Frames / Frequency]
+	Header = ["Frame", "Time"]
+	for WindowSize, Curve in Smoothed.items():
+		Columns += list(Curve.T)
+		Header += [f"{name} ({WindowSize} frames)" for name in Names]
+	np.savetxt(f"{FileName}.csv", np.column_stack(Columns), delimiter=",", header=",".join(Header), comments="", fmt="%.4f")
 
-		padding = 0
-		for key in BoneData:
-			padding = max(len(key), padding)
+	print(f"Similarity timeline exported to {FileName}.csv and {FileName}.npz")
 
-		# Sorts the dict by the accuracy of the joint, least accurate first
-		BoneData = {k: v for k, v in sorted(BoneData.items(), key=lambda item: item[1])}
+# Marks the places where the mimic was the furthest off with events on the QTM timeline
+def addWorstDipsAsEvents() -> None:
+	Timeline = getLastComparisonTimeline()
+	if Timeline == None:
+		return
+	Result, Frequency, WindowSizes, Smoothed = Timeline
 
-		print("Bone accuracy (Sorted):")
-		for key, val in BoneData.items():
-			val /= numbersOfMeasurement
-			print(f"{key:{padding + 1}}: {val:.2f}")
+	# NOTE Uses the widest window so that single frame glitches don't take up all of the events
+	WindowSize = max(WindowSizes)
+	Overall = Smoothed[WindowSize][:, -1]
+	Dips = getWorstDips(Overall, timelineEventCount, WindowSize, timelineDipThreshold)
+	if len(Dips) == 0:
+		print(f"No dips below {timelineDipThreshold}")
 
-	# qtm.gui.message.add_message(f"Mocap Mimic: Overall accuracy: {accuracy * 100:.2f}%", "", "info")
-	# print(f"Overall accuracy: {accuracy * 100:.2f}%")
+	for Dip in Dips:
+		Frame = gLastComparison["RangeStart"] + Dip
+		qtm.data.object.event.add_event({"label": f"Mocap Mimic dip {Overall[Dip]:.2f}", "time": Frame / Frequency, "color": qtm.utilities.color.rgb(0.9, 0.2, 0.1)})
+		print(f"Dip at frame {Frame} ({Frame / Frequency:.2f}s): {Overall[Dip]:.3f}")
 
 # ----------------------------------------
-# [END] COMPARING TRAJECTORIES
+# [END] SIMILARITY TIMELINE
 # ----------------------------------------
 
 # ----------------------------------------
@@ -868,6 +2316,100 @@ def getSkeletonAsDict(SkeletonID: int, Range: dict[str: int] = None):
 	
 	return Skeleton
 
+# Bones in depth first order (same order as getAllSkeletonBoneNames) along with the index of their parent, -1 for the root
+def getSkeletonTopology(BoneDict) -> tuple[list[dict], list[int]]:
+	Bones = []
+	Parents = []
+	ToConsider = [(BoneDict, -1)]
+	while len(ToConsider) > 0:
+		Bone, Parent = ToConsider.pop()
+		Parents.append(Parent)
+		Bones.append(Bone)
+		for Child in reversed(Bone["Children"]):
+			ToConsider.append((Child, len(Bones) - 1))
+	return Bones, Parents
+
+def transformsToMatrices(Transforms: list) -> np.ndarray:
+	try:
+		return np.array(Transforms, dtype=float).reshape(-1, 4, 4)
+	except (TypeError, ValueError):
+		# Missing samples are None, they become matrices full of NaN
+		Values = transformsToArray(Transforms)
+		Matrices = np.zeros((len(Values), 4, 4))
+		Matrices[:, :3] = Values.reshape(-1, 3, 4)
+		Matrices[:, 3, 3] = 1
+		return Matrices
+
+# Local transforms of every bone for every frame, shaped (frames, bones, 4, 4)
+def getSkeletonLocalTransforms(Bones: list[dict]) -> np.ndarray:
+	return np.stack([transformsToMatrices(Bone["Transforms"]) for Bone in Bones], axis=1)
+
+# Same as multiplying down the chain in compareSkeletonPose, but for every frame at once
+def getSkeletonWorldTransforms(LocalTransforms: np.ndarray, Parents: list[int]) -> np.ndarray:
+	WorldTransforms = np.empty_like(LocalTransforms)
+	for b, Parent in enumerate(Parents):
+		if Parent == -1:
+			WorldTransforms[:, b] = LocalTransforms[:, b]
+		else:
+			WorldTransforms[:, b] = WorldTransforms[:, Parent] @ LocalTransforms[:, b]
+	return WorldTransforms
+
+# Normalizes along the last axis, zero length vectors are left as zeros just like getNormalized
+# NOTE Missing vectors (NaN) stay NaN so the frames they are in get skipped instead of scored as 0
+def getNormalizedArray(Vectors: np.ndarray) -> np.ndarray:
+	Lengths = np.linalg.norm(Vectors, axis=-1, keepdims=True)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		return np.where(Lengths == 0, 0, Vectors / Lengths)
+
+# Unit direction of every bone for every frame, shaped (frames, bones, 3), along with the bone names
+# The directions match what compareSkeletonPose (WorldAgnostic = False) and compareSkeletonPoseWorldAgnostic compare
+def getSkeletonJointDirections(BoneDict, WorldAgnostic: bool = False) -> tuple[list[str], np.ndarray]:
+	Names, Vectors = getSkeletonJointVectors(BoneDict, WorldAgnostic)
+	return Names, getNormalizedArray(Vectors)
+
+# Same as getSkeletonJointDirections but the vectors aren't normalized, so their lengths are the bone lengths
+def getSkeletonJointVectors(BoneDict, WorldAgnostic: bool = False) -> tuple[list[str], np.ndarray]:
+	Bones, Parents = getSkeletonTopology(BoneDict)
+	LocalTransforms = getSkeletonLocalTransforms(Bones)
+	Names = [Bone["Name"] for Bone in Bones]
+
+	if WorldAgnostic:
+		# The child's offset from its parent, rotated by the parent's local rotation. The root isn't scored
+		Children = [b for b in range(len(Bones)) if Parents[b] != -1]
+		ParentRotations = LocalTransforms[:, [Parents[b] for b in Children]][:, :, :3, :3]
+		Offsets = LocalTransforms[:, Children][:, :, :3, 3]
+		Directions = np.einsum("fbij,fbj->fbi", ParentRotations, Offsets)
+		return [Names[b] for b in Children], Directions
+
+	Positions = getSkeletonWorldTransforms(LocalTransforms, Parents)[:, :, :3, 3]
+	# NOTE The root is compared against the origin, same as compareSkeletonPose does with its identity parent
+	ParentPositions = np.zeros_like(Positions)
+	for b, Parent in enumerate(Parents):
+		if Parent != -1:
+			ParentPositions[:, b] = Positions[:, Parent]
+	return Names, Positions - ParentPositions
+
+# Works out the reference side of both bone comparisons once so it can be saved along with the reference
+# Structured like {"World": {"BoneNames": [...], "Directions": [...], "Lengths": [...]}, "WorldAgnostic": {...}}
+def getReferenceDirectionsData(BoneDict) -> dict[str]:
+	DirectionsData = {}
+	for Mode, WorldAgnostic in (("World", False), ("WorldAgnostic", True)):
+		Names, Vectors = getSkeletonJointVectors(BoneDict, WorldAgnostic)
+		DirectionsData[Mode] = {"BoneNames": Names, "Directions": getNormalizedArray(Vectors), "Lengths": np.linalg.norm(Vectors, axis=-1)}
+	return DirectionsData
+
+# Returns the bone names and the directions shaped (frames, bones, 3) for the reference
+# NOTE References saved before the directions were stored with them get them computed on the spot
+def getReferenceDirections(reference: dict[str], WorldAgnostic: bool) -> tuple[list[str], np.ndarray]:
+	Mode = "WorldAgnostic" if WorldAgnostic else "World"
+	if "directions" in reference:
+		Data = reference["directions"][Mode]
+		Directions = np.asarray(Data["Directions"], dtype=float).reshape(-1, len(Data["BoneNames"]), 3)
+		# Anything that doesn't line up with the skeleton anymore is recomputed rather than trusted
+		if len(Directions) == len(reference["skeleton"]["Transforms"]):
+			return Data["BoneNames"], Directions
+	return getSkeletonJointDirections(reference["skeleton"], WorldAgnostic)
+
 CurrentSkeleton = {}
 
 def drawSphere(measurement_time):
@@ -919,6 +2461,7 @@ bDrawingEnabled = False
 def drawSphereAtSkeletonRoot():
 	global BoneIDs
 	global bDrawingEnabled
+	global bHeatmapEnabled
 	global CurrentSkeleton
 	CurrentSkeleton = getSkeletonAsDict(getSelectedSkeletonID())
 
@@ -944,15 +2487,1283 @@ def drawSphereAtSkeletonRoot():
 	print(f"Skeleton Trajectory IDs: {skeletonTrajectories}")
 
 	if not bDrawingEnabled:
-		qtm.gui._3d.set_draw_function(drawSphere)
+		setDrawFunction(drawSphere)
+		bHeatmapEnabled = False
 	else:
-		qtm.gui._3d.set_draw_function()
+		setDrawFunction()
 	bDrawingEnabled = not bDrawingEnabled
 
 # ----------------------------------------
 # [END] SKELETON FUNCTIONS
 # ----------------------------------------
 
+# ----------------------------------------
+# [BEGIN] SIMILARITY HEATMAP
+# ----------------------------------------
+
+# Colours every joint of the compared skeleton by how well it matched the reference on that frame, green for a
+# perfect match and red for pointing at right angles or further off, grey where there is no score. Positions and colours for the whole range are worked out
+# when the heatmap is turned on, so drawing a frame is just looking the frame up and drawing the spheres.
+# If drawing takes longer than the budget the short bones (fingers, toes and so on) are skipped.
+bHeatmapLOD = True
+heatmapFrameBudgetInMs: float = 4.0
+heatmapMinorBoneLength: float = 80.0
+heatmapColourLevels: int = 32
+
+bHeatmapEnabled = False
+# Structured like {"RootID": 1, "RangeStart": 0, "Positions": [[[x, y, z], ...], ...], "Colours": [[...], ...], "MajorBones": [0, 1, ...]}
+gHeatmap = {}
+# How long drawing every bone took (or would have taken) last frame, in ms
+gHeatmapLastDrawTime: float = 0
+
+# NOTE To be called in the QTM console
+def setHeatmapLODEnabled(NewValue: bool):
+	global bHeatmapLOD
+	bHeatmapLOD = NewValue
+	print(f"bHeatmapLOD: {NewValue}")
+
+def setHeatmapFrameBudgetInMs(NewValue: float):
+	global heatmapFrameBudgetInMs
+	heatmapFrameBudgetInMs = NewValue
+	print(f"heatmapFrameBudgetInMs: {NewValue}")
+
+def setHeatmapMinorBoneLength(NewValue: float):
+	global heatmapMinorBoneLength
+	heatmapMinorBoneLength = NewValue
+	print(f"heatmapMinorBoneLength: {NewValue}")
+
+# Scores are bucketed into a fixed amount of colours so qtm only has to make those once. Negative scores clamp to the
+# worst colour, and anything without a score (NaN) gets the neutral colour at the end of the palette
+def getHeatmapColourIndices(FrameScores: np.ndarray) -> np.ndarray:
+	Fraction = np.clip(np.nan_to_num(FrameScores, nan=0.0), 0, 1)
+	Indices = np.rint(Fraction * (heatmapColourLevels - 1)).astype(int)
+	Indices[np.isnan(FrameScores)] = heatmapColourLevels
+	return Indices
+
+def getHeatmapPalette() -> list:
+	Palette = []
+	for i in range(heatmapColourLevels):
+		Fraction = i / (heatmapColourLevels - 1)
+		Palette.append(qtm.utilities.color.rgb(0.9 * (1 - Fraction) + 0.2 * Fraction, 0.15 * (1 - Fraction) + 0.661 * Fraction, 0.1 * (1 - Fraction) + 0.11 * Fraction))
+	# Missing scores
+	Palette.append(qtm.utilities.color.rgb(0.5, 0.5, 0.5))
+	return Palette
+
+def buildHeatmap(SkeletonID: int, RangeStart: int, Result: dict[str]) -> dict[str]:
+	# NOTE Same as the chunked comparison, the range is fetched so that it covers exactly the scored frames whether
+	# QTM includes the end frame or not
+	NumberOfMeasurements = Result["NumberOfMeasurements"]
+	Range = {"start": RangeStart, "end": RangeStart + NumberOfMeasurements - getRangeEndExtra(SkeletonID, RangeStart)}
+	mimicSkeleton = getSkeletonAsDict(SkeletonID, Range)
+
+	Bones, Parents = getSkeletonTopology(mimicSkeleton)
+	WorldTransforms = getSkeletonWorldTransforms(getSkeletonLocalTransforms(Bones), Parents)
+	Positions = WorldTransforms[:NumberOfMeasurements, :, :3, 3]
+
+	# Bones without a score (like the root in the world agnostic comparison) are drawn in the neutral colour
+	Scores = np.full((len(Positions), len(Bones)), np.nan)
+	for b, Bone in enumerate(Bones):
+		if Bone["Name"] in Result["BoneNames"]:
+			Scores[:, b] = Result["FrameScores"][:len(Positions), Result["BoneNames"].index(Bone["Name"])]
+
+	Palette = np.empty(heatmapColourLevels + 1, dtype=object)
+	Palette[:] = getHeatmapPalette()
+
+	BoneLengths = np.zeros(len(Bones))
+	for b, Parent in enumerate(Parents):
+		if Parent != -1:
+			BoneLengths[b] = np.nanmean(np.linalg.norm(Positions[:, b] - Positions[:, Parent], axis=1))
+
+	# NOTE Frames with missing data are stored as None and just don't get drawn
+	PositionList = Positions.tolist()
+	for f in np.flatnonzero(np.isnan(Positions).any(axis=(1, 2))):
+		PositionList[f] = None
+
+	return {
+		"RootID": Bones[0]["ID"],
+		"RangeStart": RangeStart,
+		"Positions": PositionList,
+		"Colours": Palette[getHeatmapColourIndices(Scores)].tolist(),
+		"MajorBones": [b for b in range(len(Bones)) if Parents[b] == -1 or BoneLengths[b] >= heatmapMinorBoneLength],
+	}
+
+def drawSimilarityHeatmap(measurement_time):
+	global gHeatmapLastDrawTime
+
+	Frame = qtm.data.series.skeleton.get_sample_index_at_time(gHeatmap["RootID"], measurement_time) - gHeatmap["RangeStart"]
+	if Frame < 0 or Frame >= len(gHeatmap["Positions"]) or gHeatmap["Positions"][Frame] == None:
+		return
+
+	Positions = gHeatmap["Positions"][Frame]
+	Colours = gHeatmap["Colours"][Frame]
+	Bones = range(len(Positions))
+	if bHeatmapLOD and gHeatmapLastDrawTime > heatmapFrameBudgetInMs:
+		Bones = gHeatmap["MajorBones"]
+
+	StartTime = time.perf_counter()
+	for b in Bones:
+		qtm.gui._3d.draw_sphere(Positions[b], 100, Colours[b])
+
+	# NOTE Always stores how long drawing every bone would have taken, so it can switch back once there's time again
+	gHeatmapLastDrawTime = (time.perf_counter() - StartTime) * 1000 * len(Positions) / max(len(Bones), 1)
+
+def toggleSimilarityHeatmap() -> None:
+	global bHeatmapEnabled
+	global bDrawingEnabled
+	global gHeatmap
+	global gHeatmapLastDrawTime
+
+	if bHeatmapEnabled:
+		setDrawFunction()
+		gHeatmap = {}
+		bHeatmapEnabled = False
+		print("Similarity heatmap disabled")
+		return
+
+	if gLastComparison.get("SkeletonID") == None:
+		print("Run a skeleton bone comparison first!")
+		return
+
+	gHeatmap = buildHeatmap(gLastComparison["SkeletonID"], gLastComparison["RangeStart"], gLastComparison["Result"])
+	gHeatmapLastDrawTime = 0
+	# NOTE The 3D view only has one draw function, so this takes over from the skeleton spheres
+	bDrawingEnabled = False
+	setDrawFunction(drawSimilarityHeatmap)
+	bHeatmapEnabled = True
+	print(f"Similarity heatmap enabled, {len(gHeatmap['Positions'])} frames precomputed")
+
+# ----------------------------------------
+# [END] SIMILARITY HEATMAP
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] FACING ALIGNMENT
+# ----------------------------------------
+
+# Compares the bones after turning the mimic to face the same way as the reference, so someone doing the same
+# movement facing another wall still scores well. For every frame the rotation that best lines the mimic's joint
+# positions up with the reference's is worked out (Kabsch), either around the vertical axis only or in full. All of
+# the frames are solved in one batched SVD, the yaw only case doesn't even need that since it has a closed form.
+bAlignYawOnly = True
+
+# NOTE QTM is Z up unless the project has been set up otherwise
+alignmentUpAxis: int = 2
+
+# NOTE To be called in the QTM console
+def setAlignYawOnly(NewValue: bool):
+	global bAlignYawOnly
+	bAlignYawOnly = NewValue
+	print(f"bAlignYawOnly: {NewValue}")
+
+# World position of every bone for every frame shaped (frames, bones, 3), along with the names and parent indices
+def getSkeletonJointPositions(BoneDict) -> tuple[list[str], list[int], np.ndarray]:
+	Bones, Parents = getSkeletonTopology(BoneDict)
+	Positions = getSkeletonWorldTransforms(getSkeletonLocalTransforms(Bones), Parents)[:, :, :3, 3]
+	return [Bone["Name"] for Bone in Bones], Parents, Positions
+
+# The rotations shaped (frames, 3, 3) that turn the mimic's centred joint positions onto the reference's
+# Frames where either side is missing get the identity
+def getAlignmentRotations(RefPositions: np.ndarray, MimicPositions: np.ndarray, YawOnly: bool) -> np.ndarray:
+	RefCentred = RefPositions - RefPositions.mean(axis=1, keepdims=True)
+	MimicCentred = MimicPositions - MimicPositions.mean(axis=1, keepdims=True)
+	Valid = np.isfinite(RefCentred).all(axis=(1, 2)) & np.isfinite(MimicCentred).all(axis=(1, 2))
+	RefCentred = np.where(Valid[:, None, None], RefCentred, 0)
+	MimicCentred = np.where(Valid[:, None, None], MimicCentred, 0)
+
+	Rotations = np.tile(np.eye(3), (len(RefPositions), 1, 1))
+	if YawOnly:
+		# The angle that maximizes the sum of dot products in the ground plane
+		X, Y = [axis for axis in range(3) if axis != alignmentUpAxis]
+		Sin = np.einsum("fb,fb->f", RefCentred[:, :, Y], MimicCentred[:, :, X]) - np.einsum("fb,fb->f", RefCentred[:, :, X], MimicCentred[:, :, Y])
+		Cos = np.einsum("fb,fb->f", RefCentred[:, :, X], MimicCentred[:, :, X]) + np.einsum("fb,fb->f", RefCentred[:, :, Y], MimicCentred[:, :, Y])
+		Angle = np.arctan2(Sin, Cos)
+		Rotations[:, X, X] = np.cos(Angle)
+		Rotations[:, X, Y] = -np.sin(Angle)
+		Rotations[:, Y, X] = np.sin(Angle)
+		Rotations[:, Y, Y] = np.cos(Angle)
+		return Rotations
+
+	Covariance = np.einsum("fbi,fbj->fij", MimicCentred, RefCentred)
+	U, S, Vt = np.linalg.svd(Covariance)
+	V = np.swapaxes(Vt, 1, 2)
+	# NOTE A reflection would line the points up better in some cases but isn't something a person can do
+	Determinant = np.sign(np.linalg.det(V @ np.swapaxes(U, 1, 2)))
+	V[:, :, 2] *= np.where(Determinant == 0, 1, Determinant)[:, None]
+	Rotations[Valid] = (V @ np.swapaxes(U, 1, 2))[Valid]
+	return Rotations
+
+# Scores every bone that has a parent by the direction from its parent, after the mimic has been turned to face
+# the reference. Shaped (frames, bones - 1), missing frames are NaN
+def getAlignedFrameBoneScores(RefPositions: np.ndarray, MimicPositions: np.ndarray, Parents: list[int], YawOnly: bool) -> np.ndarray:
+	Children = [b for b in range(len(Parents)) if Parents[b] != -1]
+	ParentIndices = [Parents[b] for b in Children]
+	Rotations = getAlignmentRotations(RefPositions, MimicPositions, YawOnly)
+
+	RefDirections = getNormalizedArray(RefPositions[:, Children] - RefPositions[:, ParentIndices])
+	MimicDirections = getNormalizedArray(np.einsum("fij,fbj->fbi", Rotations, MimicPositions[:, Children] - MimicPositions[:, ParentIndices]))
+	return np.einsum("fbi,fbi->fb", RefDirections, MimicDirections)
+
+# Same as compareSkeletonBones but in the aligned frame
+def compareSkeletonBonesAligned(referenceSkeleton, mimicSkeleton, segments, YawOnly: bool, DoCoarsePass: bool, Resolution: int, Job = None) -> dict[str]:
+	CacheKey = getResultCacheKey(["bonesAligned", YawOnly, alignmentUpAxis, DoCoarsePass, Resolution if DoCoarsePass else 0, getSkeletonContentHash(referenceSkeleton), getSkeletonContentHash(mimicSkeleton)])
+	Cached = loadCachedResult(CacheKey)
+	if Cached != None:
+		Result = summarizeBoneScores(Cached["BoneNames"].tolist(), Cached["FrameScores"], int(Cached["Offset"]), segments)
+		Result.update({"Cached": True})
+		return Result
+
+	Names, Parents, RefPositions = getSkeletonJointPositions(referenceSkeleton)
+	MimicNames, MimicParents, MimicPositions = getSkeletonJointPositions(mimicSkeleton)
+	MimicPositions = getColumnsInBoneOrder(Names, MimicNames, MimicPositions)
+	if MimicPositions is None:
+		raise ValueError("The mimic skeleton doesn't have all of the reference's bones")
+	BoneNames = [Names[b] for b in range(len(Names)) if Parents[b] != -1]
+
+	Overshoot: int = len(MimicPositions) - len(RefPositions)
+	numbersOfMeasurement = len(RefPositions)
+	Offset = 0
+	if DoCoarsePass:
+		Offset = findBestOffset(lambda j, Step: np.nansum(getAlignedFrameBoneScores(RefPositions[::Step], MimicPositions[j:j + numbersOfMeasurement:Step], Parents, YawOnly)), Overshoot, Resolution, Job)
+		if Offset == None:
+			return None
+
+	FrameScores = getAlignedFrameBoneScores(RefPositions, MimicPositions[Offset:Offset + numbersOfMeasurement], Parents, YawOnly)
+
+	saveCachedResult(CacheKey, {"BoneNames": np.array(BoneNames), "FrameScores": FrameScores, "Offset": np.array(Offset)})
+
+	return summarizeBoneScores(BoneNames, FrameScores, Offset, segments)
+
+def compareSelectedSkeletonBonesAgainstReferenceFacingInvariant() -> None:
+	startSkeletonBonesComparison(False, True)
+
+# ----------------------------------------
+# [END] FACING ALIGNMENT
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] RESAMPLING
+# ----------------------------------------
+
+# References remember the rate they were captured at and are resampled to the take's rate before they are scored,
+# otherwise a 100 Hz reference against a 300 Hz take would be compared one frame to one frame at three times the
+# speed. Positions are interpolated linearly and rotations with SLERP, for every frame and bone at once. A
+# comparisonFrequency below the take's rate scores both sides at that lower rate instead, which is quicker.
+comparisonFrequency: float = 0
+resampleCacheSize: int = 8
+
+# Structured like {(ContentHash, FromFrequency, ToFrequency): ResampledData}, oldest first
+gResampleCache = {}
+
+# NOTE To be called in the QTM console
+def setComparisonFrequency(NewValue: float):
+	global comparisonFrequency
+	comparisonFrequency = NewValue
+	print(f"comparisonFrequency: {NewValue}")
+
+# References saved before the frequency was stored with them are assumed to match the current take
+# NOTE Only those go to qtm for the take's rate, which has to happen on the UI thread
+def getCaptureFrequency(Data: dict[str]) -> float:
+	return Data["frequency"] if "frequency" in Data else qtm.gui.timeline.get_frequency()
+
+# The rate a comparison is scored at, never above the take's own rate
+def getComparisonFrequency(TakeFrequency: float) -> float:
+	return min(comparisonFrequency, TakeFrequency) if comparisonFrequency > 0 else TakeFrequency
+
+def isSameFrequency(FromFrequency: float, ToFrequency: float) -> bool:
+	return abs(FromFrequency - ToFrequency) < 1e-6
+
+def getResampledLength(Length: int, FromFrequency: float, ToFrequency: float) -> int:
+	if Length < 2 or isSameFrequency(FromFrequency, ToFrequency):
+		return Length
+	return int(math.floor((Length - 1) * ToFrequency / FromFrequency + 1e-9)) + 1
+
+# Where every new frame falls between the old ones, in old frames
+def getResampleTimes(Length: int, FromFrequency: float, ToFrequency: float) -> np.ndarray:
+	return np.arange(getResampledLength(Length, FromFrequency, ToFrequency)) * (FromFrequency / ToFrequency)
+
+def getResampleIndices(Length: int, Times: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+	Lower = np.clip(np.floor(Times).astype(int), 0, max(Length - 2, 0))
+	Upper = np.minimum(Lower + 1, Length - 1)
+	return Lower, Upper
+
+# Linear interpolation along the first axis, a missing frame (NaN) only affects the new frames that fall between it
+# and its neighbours. New frames that land right on an old one take it as is
+def interpolateFrames(Values: np.ndarray, Times: np.ndarray) -> np.ndarray:
+	Lower, Upper = getResampleIndices(len(Values), Times)
+	Weights = (Times - Lower).reshape((-1,) + (1,) * (Values.ndim - 1))
+	with np.errstate(invalid="ignore"):
+		Blended = Values[Lower] * (1 - Weights) + Values[Upper] * Weights
+	return np.where(Weights == 0, Values[Lower], np.where(Weights == 1, Values[Upper], Blended))
+
+# Rotation matrices shaped (..., 3, 3) to unit quaternions shaped (..., 4) as [w, x, y, z]
+def matricesToQuaternions(Rotations: np.ndarray) -> np.ndarray:
+	R = Rotations
+	Diagonals = np.stack([R[..., 0, 0] + R[..., 1, 1] + R[..., 2, 2], R[..., 0, 0] - R[..., 1, 1] - R[..., 2, 2], R[..., 1, 1] - R[..., 0, 0] - R[..., 2, 2], R[..., 2, 2] - R[..., 0, 0] - R[..., 1, 1]], axis=-1)
+	# Each row is the quaternion scaled by 4 times one of its components, the one with the largest component is the most accurate
+	Candidates = np.stack([
+		np.stack([1 + Diagonals[..., 0], R[..., 2, 1] - R[..., 1, 2], R[..., 0, 2] - R[..., 2, 0], R[..., 1, 0] - R[..., 0, 1]], axis=-1),
+		np.stack([R[..., 2, 1] - R[..., 1, 2], 1 + Diagonals[..., 1], R[..., 0, 1] + R[..., 1, 0], R[..., 0, 2] + R[..., 2, 0]], axis=-1),
+		np.stack([R[..., 0, 2] - R[..., 2, 0], R[..., 0, 1] + R[..., 1, 0], 1 + Diagonals[..., 2], R[..., 1, 2] + R[..., 2, 1]], axis=-1),
+		np.stack([R[..., 1, 0] - R[..., 0, 1], R[..., 0, 2] + R[..., 2, 0], R[..., 1, 2] + R[..., 2, 1], 1 + Diagonals[..., 3]], axis=-1),
+	], axis=-2)
+	Best = np.argmax(np.nan_to_num(Diagonals, nan=0), axis=-1)
+	Quaternions = np.take_along_axis(Candidates, Best[..., None, None], axis=-2)[..., 0, :]
+	return getNormalizedArray(Quaternions)
+
+def quaternionsToMatrices(Quaternions: np.ndarray) -> np.ndarray:
+	w, x, y, z = np.moveaxis(Quaternions, -1, 0)
+	return np.stack([
+		np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+		np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+		np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+	], axis=-2)
+
+# SLERP along the first axis, the same as interpolateFrames but for quaternions
+def slerpFrames(Quaternions: np.ndarray, Times: np.ndarray) -> np.ndarray:
+	Lower, Upper = getResampleIndices(len(Quaternions), Times)
+	Weights = (Times - Lower).reshape((-1,) + (1,) * (Quaternions.ndim - 1))
+	From = Quaternions[Lower]
+	To = Quaternions[Upper]
+
+	# q and -q are the same rotation, flipping one of them makes sure it goes the short way around
+	Dot = np.sum(From * To, axis=-1, keepdims=True)
+	To = np.where(Dot < 0, -To, To)
+	Dot = np.clip(np.abs(Dot), 0, 1)
+
+	Angle = np.arccos(Dot)
+	SinAngle = np.sin(Angle)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		FromWeights = np.where(SinAngle > 1e-6, np.sin((1 - Weights) * Angle) / SinAngle, 1 - Weights)
+		ToWeights = np.where(SinAngle > 1e-6, np.sin(Weights * Angle) / SinAngle, Weights)
+	Blended = getNormalizedArray(From * FromWeights + To * ToWeights)
+	return np.where(Weights == 0, Quaternions[Lower], np.where(Weights == 1, Quaternions[Upper], Blended))
+
+# Matrices shaped (frames, ..., 4, 4), the translations are interpolated and the rotations SLERPed
+def resampleMatrices(Matrices: np.ndarray, Times: np.ndarray) -> np.ndarray:
+	Resampled = np.zeros((len(Times),) + Matrices.shape[1:])
+	Resampled[..., :3, :3] = quaternionsToMatrices(slerpFrames(matricesToQuaternions(Matrices[..., :3, :3]), Times))
+	Resampled[..., :3, 3] = interpolateFrames(Matrices[..., :3, 3], Times)
+	Resampled[..., 3, 3] = 1
+	return Resampled
+
+# Returns a copy of the skeleton at the new rate, the same take and rate is only ever resampled once
+# UseCache = False skips the cache both ways, same as for readReferenceFile
+def resampleSkeleton(BoneDict, FromFrequency: float, ToFrequency: float, UseCache: bool = True):
+	if isSameFrequency(FromFrequency, ToFrequency):
+		return BoneDict
+
+	if UseCache:
+		Key = (getSkeletonContentHash(BoneDict), FromFrequency, ToFrequency)
+		Cached = getCachedValue(gResampleCache, Key)
+		if Cached != None:
+			return Cached
+
+	Bones, Parents = getSkeletonTopology(BoneDict)
+	LocalTransforms = getSkeletonLocalTransforms(Bones)
+	Resampled = resampleMatrices(LocalTransforms, getResampleTimes(len(LocalTransforms), FromFrequency, ToFrequency))
+
+	Copies = []
+	for b, Bone in enumerate(Bones):
+		Copy = {key: val for key, val in Bone.items() if key != "Children"}
+		Copy.update({"Transforms": arrayToTransforms(Resampled[:, b, :3].reshape(-1, 12))})
+		Copy.update({"Children": []})
+		Copies.append(Copy)
+		if Parents[b] != -1:
+			Copies[Parents[b]]["Children"].append(Copy)
+
+	if UseCache:
+		setCachedValue(gResampleCache, Key, Copies[0], resampleCacheSize)
+	return Copies[0]
+
+def resamplePose(Pose: dict[str], FromFrequency: float, ToFrequency: float) -> dict[str]:
+	if isSameFrequency(FromFrequency, ToFrequency):
+		return Pose
+
+	Values = poseToArray(Pose)
+	Times = getResampleTimes(len(Values), FromFrequency, ToFrequency)
+	Positions = interpolateFrames(Values[:, :3], Times)
+	Rotations = quaternionsToMatrices(slerpFrames(matricesToQuaternions(Values[:, 3:].reshape(-1, 3, 3)), Times))
+
+	Missing = np.isnan(Positions).any(axis=1) | np.isnan(Rotations).any(axis=(1, 2))
+	Positions = Positions.tolist()
+	Rotations = Rotations.tolist()
+	for i in np.flatnonzero(Missing):
+		Positions[i] = None
+		Rotations[i] = None
+	return {"Positions": Positions, "Rotations": Rotations}
+
+def resampleTrajectories(Trajectories: dict[str], FromFrequency: float, ToFrequency: float) -> dict[str]:
+	if isSameFrequency(FromFrequency, ToFrequency):
+		return Trajectories
+
+	Key = (getTrajectoriesContentHash(Trajectories), FromFrequency, ToFrequency)
+	Cached = getCachedValue(gResampleCache, Key)
+	if Cached != None:
+		return Cached
+
+	Resampled = {}
+	for label, points in Trajectories.items():
+		Values, Fields = trajectoryToArray(points)
+		Resampled.update({label: arrayToTrajectory(interpolateFrames(Values, getResampleTimes(len(Values), FromFrequency, ToFrequency)), Fields)})
+
+	setCachedValue(gResampleCache, Key, Resampled, resampleCacheSize)
+	return Resampled
+
+# Segments are in frames, so they are scaled along with everything else and made to cover the new length
+def resampleSegments(segments: list[dict[str: int]], FromFrequency: float, ToFrequency: float, Length: int) -> list[dict[str: int]]:
+	if len(segments) == 0 or isSameFrequency(FromFrequency, ToFrequency):
+		return segments
+	Boundaries = [min(int(round(segment["start"] * ToFrequency / FromFrequency)), Length) for segment in segments[1:]]
+	return getSegmentsAsRanges([0] + Boundaries + [Length])
+
+# Returns the reference as if it had been captured at the given rate, anything worked out at the old rate is dropped
+# ReferenceFrequency has to be passed in (see getCaptureFrequency) when this is called from a worker thread
+def getReferenceAtFrequency(reference: dict[str], Frequency: float, ReferenceFrequency: float = None) -> dict[str]:
+	if ReferenceFrequency == None:
+		ReferenceFrequency = getCaptureFrequency(reference)
+	if isSameFrequency(ReferenceFrequency, Frequency):
+		return reference
+
+	Resampled = {key: val for key, val in reference.items() if key != "directions"}
+	if "skeleton" in reference:
+		Resampled["skeleton"] = resampleSkeleton(reference["skeleton"], ReferenceFrequency, Frequency)
+		Length = len(Resampled["skeleton"]["Transforms"])
+	if "trajectories" in reference:
+		Resampled["trajectories"] = resampleTrajectories(reference["trajectories"], ReferenceFrequency, Frequency)
+		Length = len(next(iter(Resampled["trajectories"].values()), []))
+	if "pose" in reference:
+		Resampled["pose"] = resamplePose(reference["pose"], ReferenceFrequency, Frequency)
+		Length = len(Resampled["pose"]["Positions"])
+	if "segments" in reference:
+		Resampled["segments"] = resampleSegments(reference["segments"], ReferenceFrequency, Frequency, Length)
+	Resampled.update({"frequency": Frequency})
+	return Resampled
+
+# Brings a result that was scored at a lower rate back to the take's frames so the timeline, heatmap and exports line up
+# NOTE The segments are scaled straight from SegmentsFrequency so they aren't rounded twice
+def getResultAtFrequency(Result: dict[str], Frequency: float, TakeFrequency: float, segments, SegmentsFrequency: float) -> dict[str]:
+	if Result == None:
+		return None
+	if not isSameFrequency(Frequency, TakeFrequency):
+		FrameScores = interpolateFrames(Result["FrameScores"], getResampleTimes(len(Result["FrameScores"]), Frequency, TakeFrequency))
+		Offset = int(round(Result["Offset"] * TakeFrequency / Frequency))
+		Cached = Result.get("Cached", False)
+		Result = summarizeBoneScores(Result["BoneNames"], FrameScores, Offset, resampleSegments(segments, SegmentsFrequency, TakeFrequency, len(FrameScores)))
+		Result.update({"Cached": Cached})
+	Result.update({"Frequency": TakeFrequency, "ComparisonFrequency": Frequency})
+	return Result
+
+# ----------------------------------------
+# [END] RESAMPLING
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] DYNAMICS
+# ----------------------------------------
+
+# Scores how the markers and joints move instead of only where they point. Velocity and acceleration come from a
+# Savitzky-Golay filter (fitting a polynomial over a short window around every frame), which is far less sensitive
+# to marker jitter than one frame differences. Every label or bone gets a speed, direction and acceleration score
+# per frame, the derivatives of a take are only worked out once and reused for every offset and segment.
+dynamicsWindowInSeconds: float = 0.1
+dynamicsPolynomialOrder: int = 3
+dynamicsStillSpeed: float = 20.0
+dynamicsCacheSize: int = 8
+# NOTE The cache outlives a reload, so this is bumped whenever the derivatives themselves change
+dynamicsCacheVersion: int = 2
+
+# Structured like {(Version, ContentHash, Frequency, Window, Order): (Names, Velocity, Acceleration)}, oldest first
+gDynamicsCache = {}
+
+# NOTE To be called in the QTM console
+def setDynamicsWindowInSeconds(NewValue: float):
+	global dynamicsWindowInSeconds
+	dynamicsWindowInSeconds = NewValue
+	print(f"dynamicsWindowInSeconds: {NewValue}")
+
+# NOTE The acceleration is the second derivative, so anything below 2 can't give one
+def setDynamicsPolynomialOrder(NewValue: int):
+	global dynamicsPolynomialOrder
+	if NewValue < 2:
+		print(f"dynamicsPolynomialOrder has to be at least 2, using 2 instead of {NewValue}")
+	dynamicsPolynomialOrder = max(2, int(NewValue))
+	print(f"dynamicsPolynomialOrder: {dynamicsPolynomialOrder}")
+
+# In mm/s, anything slower than this counts as standing still
+def setDynamicsStillSpeed(NewValue: float):
+	global dynamicsStillSpeed
+	dynamicsStillSpeed = NewValue
+	print(f"dynamicsStillSpeed: {NewValue}")
+
+# Also clamped here in case dynamicsPolynomialOrder was set straight from the console
+def getDynamicsPolynomialOrder() -> int:
+	return max(2, int(dynamicsPolynomialOrder))
+
+# Window length in frames, always odd and long enough to fit the polynomial
+def getSavitzkyGolayWindow(Frequency: float) -> int:
+	Window = max(int(round(dynamicsWindowInSeconds * Frequency)), getDynamicsPolynomialOrder() + 2)
+	return Window + 1 - Window % 2
+
+# Weights that give the Derivative-th derivative of the fitted polynomial when applied to the window's samples
+# At is how many frames from the centre of the window it is evaluated at
+def getSavitzkyGolayCoefficients(Window: int, Order: int, Derivative: int, At: int = 0) -> np.ndarray:
+	Half = Window // 2
+	Vandermonde = np.vander(np.arange(-Half, Half + 1), Order + 1, increasing=True)
+	Fit = np.linalg.pinv(Vandermonde)
+	Coefficients = np.zeros(Window)
+	for Power in range(Derivative, Order + 1):
+		Coefficients += Fit[Power] * (math.factorial(Power) // math.factorial(Power - Derivative)) * float(At) ** (Power - Derivative)
+	return Coefficients
+
+# Filters along the first axis of the whole array at once, a missing frame (NaN) only affects the frames within a window of it
+def applySavitzkyGolay(Values: np.ndarray, Window: int, Order: int, Derivative: int, Frequency: float) -> np.ndarray:
+	if len(Values) < 2:
+		return np.zeros_like(Values)
+	# A take shorter than the window gets a single polynomial fitted over all of it
+	Window = min(Window, len(Values) - 1 + len(Values) % 2)
+	Order = min(Order, Window - 1)
+	Half = Window // 2
+	Windows = np.lib.stride_tricks.sliding_window_view(Values, Window, axis=0)
+
+	Filtered = np.empty(Values.shape)
+	Filtered[Half:len(Values) - Half] = Windows @ getSavitzkyGolayCoefficients(Window, Order, Derivative)
+	# NOTE The frames without a full window around them are read off the polynomial fitted to the first or last
+	# window instead of padding the ends, so the derivatives at the edges are as accurate as the fit allows
+	for Frame in range(Half):
+		Filtered[Frame] = Windows[0] @ getSavitzkyGolayCoefficients(Window, Order, Derivative, Frame - Half)
+		Filtered[len(Values) - Half + Frame] = Windows[-1] @ getSavitzkyGolayCoefficients(Window, Order, Derivative, Frame + 1)
+	return Filtered * Frequency ** Derivative
+
+# Positions shaped (frames, points, 3), returns the velocity and acceleration shaped the same way
+def getDerivatives(Positions: np.ndarray, Frequency: float) -> tuple[np.ndarray, np.ndarray]:
+	Window = getSavitzkyGolayWindow(Frequency)
+	Order = min(getDynamicsPolynomialOrder(), Window - 1)
+	return applySavitzkyGolay(Positions, Window, Order, 1, Frequency), applySavitzkyGolay(Positions, Window, Order, 2, Frequency)
+
+def getDynamicsCacheKey(ContentHash: str, Frequency: float) -> tuple:
+	return (dynamicsCacheVersion, ContentHash, Frequency, dynamicsWindowInSeconds, getDynamicsPolynomialOrder())
+
+# Velocity and acceleration of every joint of the skeleton, only worked out once per take
+def getSkeletonDynamics(BoneDict, Frequency: float) -> tuple[list[str], np.ndarray, np.ndarray]:
+	Key = getDynamicsCacheKey(getSkeletonContentHash(BoneDict), Frequency)
+	Cached = getCachedValue(gDynamicsCache, Key)
+	if Cached != None:
+		return Cached
+
+	Names, Parents, Positions = getSkeletonJointPositions(BoneDict)
+	Velocity, Acceleration = getDerivatives(Positions, Frequency)
+	setCachedValue(gDynamicsCache, Key, (Names, Velocity, Acceleration), dynamicsCacheSize)
+	return Names, Velocity, Acceleration
+
+# Same thing for the markers, structured like the output of getTrajectoriesFormatted
+def getTrajectoriesDynamics(Trajectories: dict[str], Frequency: float) -> tuple[list[str], np.ndarray, np.ndarray]:
+	Key = getDynamicsCacheKey(getTrajectoriesContentHash(Trajectories), Frequency)
+	Cached = getCachedValue(gDynamicsCache, Key)
+	if Cached != None:
+		return Cached
+
+	Labels = list(Trajectories.keys())
+	Positions = np.full((len(next(iter(Trajectories.values()), [])), len(Labels), 3), np.nan)
+	for l, label in enumerate(Labels):
+		for i, point in enumerate(Trajectories[label]):
+			if point != None:
+				Positions[i, l] = point["position"]
+	Velocity, Acceleration = getDerivatives(Positions, Frequency)
+	setCachedValue(gDynamicsCache, Key, (Labels, Velocity, Acceleration), dynamicsCacheSize)
+	return Labels, Velocity, Acceleration
+
+# How close two magnitudes are, 1 for the same and 0 when one of them is zero. Both below Still counts as the same
+def getMagnitudeScores(Ref: np.ndarray, Mimic: np.ndarray, Still: float) -> np.ndarray:
+	return 1 - np.abs(Ref - Mimic) / np.maximum(np.maximum(Ref, Mimic), Still)
+
+# Returns the speed, direction and acceleration scores, each shaped (frames, points). Missing frames are NaN
+def getDynamicsFrameScores(RefVelocity: np.ndarray, RefAcceleration: np.ndarray, MimicVelocity: np.ndarray, MimicAcceleration: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+	RefSpeed = np.linalg.norm(RefVelocity, axis=-1)
+	MimicSpeed = np.linalg.norm(MimicVelocity, axis=-1)
+
+	with np.errstate(invalid="ignore", divide="ignore"):
+		Direction = np.maximum(0, np.einsum("fbi,fbi->fb", RefVelocity, MimicVelocity) / (RefSpeed * MimicSpeed))
+	# NOTE Both standing still counts as a perfect match and only one of them moving as no match, just like in compareTrajectories
+	RefStill = RefSpeed < dynamicsStillSpeed
+	MimicStill = MimicSpeed < dynamicsStillSpeed
+	Direction = np.where(RefStill & MimicStill, 1, np.where(RefStill ^ MimicStill, 0, Direction))
+	Direction[np.isnan(RefSpeed) | np.isnan(MimicSpeed)] = np.nan
+
+	Speed = getMagnitudeScores(RefSpeed, MimicSpeed, dynamicsStillSpeed)
+	# The acceleration it takes to get up to the still speed within one window
+	Acceleration = getMagnitudeScores(np.linalg.norm(RefAcceleration, axis=-1), np.linalg.norm(MimicAcceleration, axis=-1), dynamicsStillSpeed / max(dynamicsWindowInSeconds, 1e-6))
+	return Speed, Direction, Acceleration
+
+# The mimic's points have to be in the same order as the reference's
+def compareDynamics(Names: list[str], RefVelocity: np.ndarray, RefAcceleration: np.ndarray, MimicVelocity: np.ndarray, MimicAcceleration: np.ndarray, segments, DoCoarsePass: bool, Resolution: int, Job = None) -> dict[str]:
+	numbersOfMeasurement = len(RefVelocity)
+	Overshoot: int = len(MimicVelocity) - numbersOfMeasurement
+	def getOffsetScore(j: int, Step: int) -> float:
+		Scores = getDynamicsFrameScores(RefVelocity[::Step], RefAcceleration[::Step], MimicVelocity[j:j + numbersOfMeasurement:Step], MimicAcceleration[j:j + numbersOfMeasurement:Step])
+		return sum(np.nansum(Score) for Score in Scores)
+
+	Offset = 0
+	if DoCoarsePass:
+		Offset = findBestOffset(getOffsetScore, Overshoot, Resolution, Job)
+		if Offset == None:
+			return None
+
+	Speed, Direction, Acceleration = getDynamicsFrameScores(RefVelocity, RefAcceleration, MimicVelocity[Offset:Offset + numbersOfMeasurement], MimicAcceleration[Offset:Offset + numbersOfMeasurement])
+
+	# NOTE The three are averaged into one score per frame so segments, the timeline and the heatmap work like for any other comparison
+	Result = summarizeBoneScores(Names, (Speed + Direction + Acceleration) / 3, Offset, segments)
+	Result.update({"Dynamics": {Metric: dict(zip(Names, getColumnAverages(Scores).tolist())) for Metric, Scores in (("Speed", Speed), ("Direction", Direction), ("Acceleration", Acceleration))}})
+	return Result
+
+def printDynamicsResults(Result: dict[str]) -> None:
+	Dynamics = Result["Dynamics"]
+	padding = max([len(name) for name in Result["BoneNames"]] + [4])
+	print(f"{'Name':{padding}} | Speed | Direction | Acceleration")
+	for name in Result["BoneNames"]:
+		print(f"{name:{padding}} | {Dynamics['Speed'][name]:5.2f} | {Dynamics['Direction'][name]:9.2f} | {Dynamics['Acceleration'][name]:12.2f}")
+
+# Has to be called on the UI thread, the reference is brought to the take's rate first
+def startTrajectoryDynamicsComparison(reference: dict[str], selected_trajectories: dict[str]) -> None:
+	selected_range = qtm.gui.timeline.get_selected_range()
+	Frequency = qtm.gui.timeline.get_frequency()
+	reference = getReferenceAtFrequency(reference, Frequency)
+	reference_trajectories = reference["trajectories"]
+	segments = reference["segments"]
+
+	if len(reference_trajectories) != len(selected_trajectories):
+		qtm.gui.message.add_message("Mocap Mimic: Reference capture and current capture are different sizes", "The reference capture saved to file has a different number of labels than the currently selected capture, they are probably different types of objects", "error")
+		return
+
+	# NOTE This assumes that the trajectories are identically named aside from their prefix, same as compareTrajectories
+	base_prefix = getPrefix(list(reference_trajectories.keys()))
+	mimic_prefix = getPrefix(list(selected_trajectories.keys()))
+	MimicLabels = [mimic_prefix + label[len(base_prefix):] for label in reference_trajectories]
+	if not set(MimicLabels).issubset(selected_trajectories):
+		qtm.gui.message.add_message("Mocap Mimic: Labels don't match", "The selected trajectories aren't labelled the same way as the reference", "error")
+		return
+
+	Overshoot = len(next(iter(selected_trajectories.values()))) - len(next(iter(reference_trajectories.values())))
+	if Overshoot < 0:
+		print(f"Mimic must be at least as long as the reference! Need {-Overshoot} more samples")
+		return
+
+	DoCoarsePass = bDoCoarsePass
+	Resolution = WindowPassResolution
+	print(f"Coarse Pass: {DoCoarsePass}, Savitzky-Golay window: {getSavitzkyGolayWindow(Frequency)} frames")
+
+	ExportSettings = getResultExportSettings(Frequency, {"dynamics": True})
+
+	def Work(Job):
+		Labels, RefVelocity, RefAcceleration = getTrajectoriesDynamics(reference_trajectories, Frequency)
+		SelectedLabels, MimicVelocity, MimicAcceleration = getTrajectoriesDynamics(selected_trajectories, Frequency)
+		Order = [SelectedLabels.index(label) for label in MimicLabels]
+		Result = compareDynamics(Labels, RefVelocity, RefAcceleration, MimicVelocity[:, Order], MimicAcceleration[:, Order], segments, DoCoarsePass, Resolution, Job)
+		return exportFinishedResult(Result, selected_range["start"], ExportSettings)
+
+	def OnDone(Result):
+		setLastComparisonResult(Result, selected_range)
+		printBoneComparisonResults(Result, selected_range, DoCoarsePass)
+		printDynamicsResults(Result)
+		printResultExportDirectory(Result)
+
+	startBackgroundJob("Comparing dynamics", Work, OnDone)
+
+def compareSkeletonDynamics(referenceSkeleton, mimicSkeleton, segments, Frequency: float, DoCoarsePass: bool, Resolution: int, Job = None) -> dict[str]:
+	Names, RefVelocity, RefAcceleration = getSkeletonDynamics(referenceSkeleton, Frequency)
+	MimicNames, MimicVelocity, MimicAcceleration = getSkeletonDynamics(mimicSkeleton, Frequency)
+	MimicVelocity = getColumnsInBoneOrder(Names, MimicNames, MimicVelocity)
+	if MimicVelocity is None:
+		raise ValueError("The mimic skeleton doesn't have all of the reference's bones")
+	MimicAcceleration = getColumnsInBoneOrder(Names, MimicNames, MimicAcceleration)
+	return compareDynamics(Names, RefVelocity, RefAcceleration, MimicVelocity, MimicAcceleration, segments, DoCoarsePass, Resolution, Job)
+
+def compareSelectedRigidBodyDynamicsAgainstReference() -> None:
+	selected_trajectories = getTrajectoriesFormatted(getSelectedRigidBodyTrajectoryIDs())
+	if len(selected_trajectories) == 0:
+		qtm.gui.message.add_message("Mocap Mimic: No rigid bodies selected", "Must select a rigid body to deal with", "error")
+		return
+	startTrajectoryDynamicsComparison(getRigidBodyReferenceFromFile(), selected_trajectories)
+
+def compareSelectedSkeletonDynamicsAgainstReference() -> None:
+	selected_trajectories = getTrajectoriesFormatted(getSelectedSkeletonTrajectoryIDs())
+	if len(selected_trajectories) == 0:
+		qtm.gui.message.add_message("Mocap Mimic: No skeleton selected", "Must select a skeleton to deal with", "error")
+		return
+	startTrajectoryDynamicsComparison(getSkeletonReferenceFromFile(), selected_trajectories)
+
+def compareSelectedSkeletonBonesDynamicsAgainstReference() -> None:
+	startSkeletonBonesComparison(False, Dynamics = True)
+
+# ----------------------------------------
+# [END] DYNAMICS
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] AUTOMATIC SEGMENTATION
+# ----------------------------------------
+
+# Places segment markers where the movement changes phase instead of by hand or at fixed intervals. The motion
+# energy (summed squared joint speeds) is worked out for every frame at once and PELT finds the change points
+# in it, which only ever keeps the candidates that can still be optimal so it runs in close to linear time.
+autoSegmentPenalty: float = 3.0
+autoSegmentMinLengthInSeconds: float = 0.25
+
+# NOTE To be called in the QTM console
+def setAutoSegmentPenalty(NewValue: float):
+	global autoSegmentPenalty
+	autoSegmentPenalty = NewValue
+	print(f"autoSegmentPenalty: {NewValue}")
+
+def setAutoSegmentMinLengthInSeconds(NewValue: float):
+	global autoSegmentMinLengthInSeconds
+	autoSegmentMinLengthInSeconds = NewValue
+	print(f"autoSegmentMinLengthInSeconds: {NewValue}")
+
+# One value per frame, how much the skeleton is moving, scaled so that frame to frame noise is about 1
+def getMotionEnergy(BoneDict) -> np.ndarray:
+	Bones, Parents = getSkeletonTopology(BoneDict)
+	Positions = getSkeletonWorldTransforms(getSkeletonLocalTransforms(Bones), Parents)[:, :, :3, 3]
+	Velocities = np.diff(Positions, axis=0, prepend=Positions[:1])
+	Energy = np.log1p(np.nansum(Velocities ** 2, axis=(1, 2)))
+
+	# Robust estimate of the noise from the median absolute frame to frame change
+	Noise = np.median(np.abs(np.diff(Energy))) / 0.6745 / math.sqrt(2) if len(Energy) > 1 else 0
+	return (Energy - Energy.mean()) / Noise if Noise > 0 else Energy - Energy.mean()
+
+# PELT with a change in mean cost, returns the frames where new segments start
+def getChangePoints(Signal: np.ndarray, Penalty: float, MinLength: int) -> list[int]:
+	Length = len(Signal)
+	MinLength = max(1, MinLength)
+	if Length < 2 * MinLength:
+		return []
+
+	Sum = np.concatenate([[0], np.cumsum(Signal)])
+	SquaredSum = np.concatenate([[0], np.cumsum(Signal ** 2)])
+
+	# Cost of frames Starts to End being one segment, for every start at once
+	def getCosts(Starts: np.ndarray, End: int) -> np.ndarray:
+		return SquaredSum[End] - SquaredSum[Starts] - (Sum[End] - Sum[Starts]) ** 2 / (End - Starts)
+
+	BestCost = np.full(Length + 1, np.inf)
+	BestCost[0] = -Penalty
+	LastChange = np.zeros(Length + 1, dtype=int)
+	Candidates = np.array([0])
+
+	for End in range(MinLength, Length + 1):
+		Admissible = Candidates[Candidates <= End - MinLength]
+		Costs = BestCost[Admissible] + getCosts(Admissible, End)
+		Best = np.argmin(Costs)
+		BestCost[End] = Costs[Best] + Penalty
+		LastChange[End] = Admissible[Best]
+
+		# Pruning, a start that can't beat the best even without the penalty never will later on either
+		Keep = (Candidates > End - MinLength)
+		Keep[Candidates <= End - MinLength] = Costs <= BestCost[End]
+		Candidates = np.append(Candidates[Keep], End)
+
+	ChangePoints = []
+	End = Length
+	while End > 0:
+		End = int(LastChange[End])
+		if End > 0:
+			ChangePoints.append(End)
+	return ChangePoints[::-1]
+
+def getAutomaticSegmentBoundaries(BoneDict, Frequency: float) -> list[int]:
+	Energy = getMotionEnergy(BoneDict)
+	return getChangePoints(Energy, autoSegmentPenalty * math.log(max(len(Energy), 2)), int(round(autoSegmentMinLengthInSeconds * Frequency)))
+
+# Replaces the segment markers with ones placed automatically on the selected skeleton, saving it as a
+# reference afterwards stores them with it like any other markers
+def addAutomaticSegmentMarkers() -> None:
+	global gSegments
+
+	selectedSkeletonID = getSelectedSkeletonID()
+	if selectedSkeletonID == -1:
+		print("No Skeleton Selected!")
+		return
+
+	selected_range = qtm.gui.timeline.get_selected_range()
+	Skeleton = getSkeletonAsDict(selectedSkeletonID, selected_range)
+	Boundaries = getAutomaticSegmentBoundaries(Skeleton, qtm.gui.timeline.get_frequency())
+
+	gSegments.clear()
+	for Boundary in Boundaries:
+		gSegments.append(selected_range["start"] + Boundary)
+	print(f"Added {len(gSegments)} markers automatically, current segments: {len(gSegments) + 1}")
+
+# Same thing for a reference that has already been saved, its segments are replaced in the file
+# Both skeleton reference files get the same segments, the trajectory and trajectory dynamics comparisons read
+# the one with the trajectories
+def addAutomaticSegmentsToReference() -> None:
+	FileNames = [getSkeletonBonesReferenceFileName(), getSkeletonReferenceFileName()]
+	reference = getSkeletonBonesReferenceFromFile()
+	Frequency = getCaptureFrequency(reference)
+	trajectoryReference = None
+	if os.path.exists(FileNames[1]):
+		trajectoryReference = getSkeletonReferenceFromFile()
+		TrajectoryFrequency = getCaptureFrequency(trajectoryReference)
+
+	def Work(Job):
+		Length = len(reference["skeleton"]["Transforms"])
+		Boundaries = getAutomaticSegmentBoundaries(reference["skeleton"], Frequency)
+		segments = getSegmentsAsRanges([0] + Boundaries + [Length]) if len(Boundaries) > 0 else []
+
+		reference.update({"segments": segments})
+		ErrorsOverBound = [writeReferenceFile(FileNames[0], reference)]
+		reportJobProgress(Job, 0.5)
+		if trajectoryReference != None:
+			TrajectoryLength = len(next(iter(trajectoryReference["trajectories"].values()), []))
+			trajectoryReference.update({"segments": resampleSegments(segments, Frequency, TrajectoryFrequency, TrajectoryLength)})
+			ErrorsOverBound.append(writeReferenceFile(FileNames[1], trajectoryReference))
+		return segments, ErrorsOverBound
+
+	def OnDone(Result):
+		segments, ErrorsOverBound = Result
+		for FileName, ErrorOverBound in zip(FileNames, ErrorsOverBound):
+			reportCompressionFallback(FileName, ErrorOverBound)
+		print(f"Reference split into {len(segments)} segments: {segments}")
+
+	startBackgroundJob("Segmenting skeleton reference", Work, OnDone)
+
+# ----------------------------------------
+# [END] AUTOMATIC SEGMENTATION
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] SUBSEQUENCE SEARCH
+# ----------------------------------------
+
+# Finds every place in a long take where the reference movement is performed, instead of just the single best one
+# the coarse pass finds. For unit direction vectors the average dot product over a window is a sliding cross
+# correlation, so the whole similarity profile comes out of one FFT per bone (the same trick MASS uses for its
+# distance profiles), which keeps searching very long takes close to linear time.
+subsequenceThreshold: float = 0.8
+bSubsequenceWorldAgnostic = False
+
+# NOTE To be called in the QTM console
+def setSubsequenceThreshold(NewValue: float):
+	global subsequenceThreshold
+	subsequenceThreshold = NewValue
+	print(f"subsequenceThreshold: {NewValue}")
+
+def setSubsequenceWorldAgnostic(NewValue: bool):
+	global bSubsequenceWorldAgnostic
+	bSubsequenceWorldAgnostic = NewValue
+	print(f"bSubsequenceWorldAgnostic: {NewValue}")
+
+# Average dot product between the reference directions and the mimic directions starting at every possible offset
+# Both are shaped (frames, bones, 3), the result has one value per offset
+def getSimilarityProfile(RefDirections: np.ndarray, MimicDirections: np.ndarray, Job = None) -> np.ndarray:
+	RefLength = len(RefDirections)
+	Offsets = len(MimicDirections) - RefLength + 1
+	# Power of two that fits the whole take plus the reference, so the circular correlation doesn't wrap around
+	FFTLength = 1 << int(math.ceil(math.log2(len(MimicDirections) + RefLength)))
+
+	Ref = np.nan_to_num(RefDirections)
+	Mimic = np.nan_to_num(MimicDirections)
+	Correlation = np.zeros(FFTLength // 2 + 1, dtype=complex)
+	# NOTE One bone at a time so memory stays at a few copies of the take instead of one per channel
+	for b in range(Ref.shape[1]):
+		if isJobCancelled(Job):
+			return None
+		Correlation += (np.fft.rfft(Mimic[:, b], FFTLength, axis=0) * np.conj(np.fft.rfft(Ref[:, b], FFTLength, axis=0))).sum(axis=1)
+		reportJobProgress(Job, 0.9 * (b + 1) / Ref.shape[1])
+
+	Profile = np.fft.irfft(Correlation, FFTLength)[:Offsets]
+	return Profile / (RefLength * Ref.shape[1])
+
+# Greedily takes the best offsets above the threshold that don't overlap with anything taken already
+def getNonOverlappingMatches(Profile: np.ndarray, Length: int, Threshold: float) -> list[int]:
+	# Only local maxima can be the best of their neighbourhood, so everything else is skipped right away
+	Padded = np.concatenate([[-np.inf], Profile, [-np.inf]])
+	IsMaximum = (Padded[1:-1] >= Padded[:-2]) & (Padded[1:-1] >= Padded[2:]) & (Profile >= Threshold)
+	Candidates = np.flatnonzero(IsMaximum)
+	Candidates = Candidates[np.argsort(-Profile[Candidates], kind="stable")]
+
+	Taken = np.zeros(len(Profile) + Length, dtype=bool)
+	Matches = []
+	for Candidate in Candidates:
+		if Taken[Candidate:Candidate + Length].any():
+			continue
+		Taken[Candidate:Candidate + Length] = True
+		Matches.append(int(Candidate))
+	return sorted(Matches)
+
+def findReferenceOccurrences(reference: dict[str], mimicSkeleton, Threshold: float, WorldAgnostic: bool, Job = None) -> list[dict]:
+	BoneNames, RefDirections = getReferenceDirections(reference, WorldAgnostic)
+	MimicBoneNames, MimicDirections = getSkeletonJointDirections(mimicSkeleton, WorldAgnostic)
+	MimicDirections = getColumnsInBoneOrder(BoneNames, MimicBoneNames, MimicDirections)
+	if MimicDirections is None:
+		raise ValueError("The mimic skeleton doesn't have all of the reference's bones")
+	RefLength = len(RefDirections)
+
+	Profile = getSimilarityProfile(RefDirections, MimicDirections, Job)
+	if Profile is None:
+		return None
+
+	Matches = []
+	for Offset in getNonOverlappingMatches(Profile, RefLength, Threshold):
+		BoneScores = np.einsum("fbi,fbi->b", np.nan_to_num(RefDirections), np.nan_to_num(MimicDirections[Offset:Offset + RefLength])) / RefLength
+		Matches.append({"Offset": Offset, "Length": RefLength, "Score": float(Profile[Offset]), "BoneData": dict(zip(BoneNames, BoneScores.tolist()))})
+	return Matches
+
+def printReferenceOccurrences(Matches: list[dict], selected_range: dict[str: int]) -> None:
+	if len(Matches) == 0:
+		print(f"No occurrences of the reference found above {subsequenceThreshold}")
+		return
+
+	freq = qtm.gui.timeline.get_frequency()
+	print(f"Found {len(Matches)} occurrences of the reference:")
+	for i, Match in enumerate(Matches):
+		Start = selected_range["start"] + Match["Offset"]
+		End = Start + Match["Length"]
+		WorstBone = min(Match["BoneData"], key=Match["BoneData"].get)
+		print(f"{i:3}: frames {Start} - {End} ({Start / freq:.2f}s - {End / freq:.2f}s), score {Match['Score']:.3f}, worst bone {WorstBone} ({Match['BoneData'][WorstBone]:.3f})")
+
+def findReferenceOccurrencesInSelectedSkeleton() -> None:
+	selected_range = qtm.gui.timeline.get_selected_range()
+	selectedSkeletonID = getSelectedSkeletonID()
+
+	if selectedSkeletonID == -1:
+		print("No Skeleton Selected!")
+		return
+
+	mimicSkeleton = getSkeletonAsDict(selectedSkeletonID, selected_range)
+	reference = getReferenceAtFrequency(getSkeletonBonesReferenceFromFile(), qtm.gui.timeline.get_frequency())
+	referenceSkeleton = reference["skeleton"]
+
+	Overshoot: int = len(mimicSkeleton["Transforms"]) - len(referenceSkeleton["Transforms"])
+	if Overshoot < 0:
+		print(f"Mimic must be at least as long as the reference! Need {-Overshoot} more samples")
+		return
+
+	Threshold = subsequenceThreshold
+	WorldAgnostic = bSubsequenceWorldAgnostic
+
+	def Work(Job):
+		return findReferenceOccurrences(reference, mimicSkeleton, Threshold, WorldAgnostic, Job)
+
+	def OnDone(Matches):
+		printReferenceOccurrences(Matches, selected_range)
+
+	startBackgroundJob("Searching for the reference", Work, OnDone)
+
+# ----------------------------------------
+# [END] SUBSEQUENCE SEARCH
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] BATCH COMPARISON
+# ----------------------------------------
+
+# Scores every skeleton in the capture against the reference at once, for group classes where everyone is
+# copying the same movement. The reference directions are only worked out once and all of the mimics are
+# stacked into one array so they get scored together.
+bBatchWorldAgnostic = False
+
+# NOTE To be called in the QTM console
+def setBatchWorldAgnostic(NewValue: bool):
+	global bBatchWorldAgnostic
+	bBatchWorldAgnostic = NewValue
+	print(f"bBatchWorldAgnostic: {NewValue}")
+
+# Mimics is {SkeletonID: skeleton dict}, skeletons that don't have all of the reference's bones are skipped
+# Returns {SkeletonID: result like summarizeBoneScores gives}, or None if the job got cancelled
+def compareSkeletonsBatched(reference: dict[str], Mimics: dict[int: dict], segments, DoCoarsePass: bool, WorldAgnostic: bool, Job = None) -> dict[int: dict]:
+	BoneNames, RefDirections = getReferenceDirections(reference, WorldAgnostic)
+	RefLength = len(RefDirections)
+
+	SkeletonIDs = []
+	Stacked = []
+	Offsets = []
+	for i, (SkeletonID, mimicSkeleton) in enumerate(Mimics.items()):
+		if isJobCancelled(Job):
+			return None
+
+		MimicBoneNames, MimicDirections = getSkeletonJointDirections(mimicSkeleton, WorldAgnostic)
+		MimicDirections = getColumnsInBoneOrder(BoneNames, MimicBoneNames, MimicDirections)
+		if MimicDirections is None or len(MimicDirections) < RefLength:
+			continue
+
+		Offset = 0
+		if DoCoarsePass:
+			Offset = int(np.argmax(getSimilarityProfile(RefDirections, MimicDirections)))
+
+		SkeletonIDs.append(SkeletonID)
+		Offsets.append(Offset)
+		Stacked.append(MimicDirections[Offset:Offset + RefLength])
+		reportJobProgress(Job, 0.9 * (i + 1) / len(Mimics))
+
+	if len(Stacked) == 0:
+		return {}
+
+	# Shaped (skeletons, frames, bones)
+	FrameScores = np.einsum("fbi,sfbi->sfb", RefDirections, np.stack(Stacked))
+	return {SkeletonID: summarizeBoneScores(BoneNames, FrameScores[s], Offsets[s], segments) for s, SkeletonID in enumerate(SkeletonIDs)}
+
+def printBatchedResults(Results: dict[int: dict], Skipped: list[int]) -> None:
+	if len(Results) == 0:
+		print("No skeletons could be compared against the reference")
+		return
+
+	Rows = []
+	for SkeletonID, Result in Results.items():
+		if "SegmentedBoneData" in Result:
+			SegmentScores = getColumnAverages(np.array(list(Result["SegmentedBoneData"].values())))
+			# NOTE Every segment counts by how many valid frames it has, so a short segment can't outweigh a long one
+			BoneScores = {}
+			for key in Result["SegmentedBoneData"]:
+				Counts = np.array([Statistics[key]["Count"] for Statistics in Result["SegmentStatistics"]])
+				Means = np.array([Statistics[key]["Mean"] for Statistics in Result["SegmentStatistics"]])
+				BoneScores[key] = float((Means * Counts).sum() / max(Counts.sum(), 1))
+		else:
+			SegmentScores = []
+			BoneScores = Result["BoneData"]
+		Overall = float(np.mean(list(BoneScores.values())))
+		WorstBone = min(BoneScores, key=BoneScores.get)
+		Rows.append((Overall, SkeletonID, WorstBone, BoneScores[WorstBone], SegmentScores, Result["Offset"]))
+
+	# Best first
+	Rows.sort(key=lambda row: -row[0])
+	Lines = [f"Rank | Skeleton | Overall | Offset | {'Worst bone':26} | Segments"]
+	for Rank, (Overall, SkeletonID, WorstBone, WorstScore, SegmentScores, Offset) in enumerate(Rows):
+		Segments = " ".join(f"{score:.2f}" for score in SegmentScores)
+		Lines.append(f"{Rank + 1:4} | {SkeletonID:8} | {Overall:7.3f} | {Offset:6} | {WorstBone:18} ({WorstScore:5.2f}) | {Segments}")
+	PrintAsBox(Lines)
+
+	if len(Skipped) > 0:
+		print(f"Skipped skeletons that don't match the reference: {Skipped}")
+
+def compareAllSkeletonsAgainstReference() -> None:
+	selected_range = qtm.gui.timeline.get_selected_range()
+	reference = getReferenceAtFrequency(getSkeletonBonesReferenceFromFile(), qtm.gui.timeline.get_frequency())
+	segments = reference["segments"]
+
+	Mimics = {}
+	for SkeletonID in qtm.data.object.skeleton.get_skeleton_ids():
+		Mimics[SkeletonID] = getSkeletonAsDict(SkeletonID, selected_range)
+
+	if len(Mimics) == 0:
+		qtm.gui.message.add_message("Mocap Mimic: No skeletons in the capture", "There has to be at least one skeleton to compare", "error")
+		return
+
+	DoCoarsePass = bDoCoarsePass
+	WorldAgnostic = bBatchWorldAgnostic
+	print(f"Comparing {len(Mimics)} skeletons, Coarse Pass: {DoCoarsePass}")
+
+	def Work(Job):
+		return compareSkeletonsBatched(reference, Mimics, segments, DoCoarsePass, WorldAgnostic, Job)
+
+	def OnDone(Results):
+		printBatchedResults(Results, [SkeletonID for SkeletonID in Mimics if not SkeletonID in Results])
+
+	startBackgroundJob("Comparing all skeletons", Work, OnDone)
+
+# ----------------------------------------
+# [END] BATCH COMPARISON
+# ----------------------------------------
+
+# ----------------------------------------
+# [BEGIN] SIMILARITY MATRIX
+# ----------------------------------------
+
+# Compares every exported take (see exportSelectedSkeletonAsTake) against every other one, for picking the best
+# reference or grouping attempts. Each take is loaded and its directions worked out once, then the pairs are split
+# into tiles that are scored in parallel. A pair's score is the best match of the shorter take anywhere in the
+# longer one (the same FFT profile the subsequence search uses). The matrix is written to disk after every tile, so
+# running it again after it was cancelled or QTM was closed only scores the pairs that are still missing.
+similarityMatrixTileSize: int = 8
+similarityMatrixWorkers: int = 0
+bSimilarityMatrixWorldAgnostic = False
+
+# NOTE To be called in the QTM console
+# 0 uses one worker per CPU core
+def setSimilarityMatrixWorkers(NewValue: int):
+	global similarityMatrixWorkers
+	similarityMatrixWorkers = NewValue
+	print(f"similarityMatrixWorkers: {NewValue}")
+
+def setSimilarityMatrixWorldAgnostic(NewValue: bool):
+	global bSimilarityMatrixWorldAgnostic
+	bSimilarityMatrixWorldAgnostic = NewValue
+	print(f"bSimilarityMatrixWorldAgnostic: {NewValue}")
+
+def getSimilarityMatrixDirectory() -> str:
+	return f"{getProjectDirectory()}MocapMimicSimilarity/"
+
+# In the order they were exported in, MocapMimicTake2 comes before MocapMimicTake10
+def getSessionTakeFileNames() -> list[str]:
+	FileNames = [FileName for FileName in os.listdir(getProjectDirectory()) if FileName.startswith("MocapMimicTake") and FileName.endswith(".json")]
+	def getTakeIndex(FileName: str):
+		Index = FileName[len("MocapMimicTake"):-len(".json")]
+		return (0, int(Index), FileName) if Index.isdigit() else (1, 0, FileName)
+	return sorted(FileNames, key=getTakeIndex)
+
+# Groups the pairs above the diagonal into square blocks, so a worker gets a decent amount of work at a time
+def getSimilarityMatrixTiles(Count: int, TileSize: int) -> list[list[tuple[int, int]]]:
+	TileSize = max(1, TileSize)
+	Tiles = []
+	for RowStart in range(0, Count, TileSize):
+		for ColumnStart in range(RowStart, Count, TileSize):
+			Pairs = [(i, j) for i in range(RowStart, min(RowStart + TileSize, Count)) for j in range(max(ColumnStart, i + 1), min(ColumnStart + TileSize, Count))]
+			if len(Pairs) > 0:
+				Tiles.append(Pairs)
+	return Tiles
+
+def getPairSimilarity(DirectionsA: np.ndarray, DirectionsB: np.ndarray) -> float:
+	Ref, Mimic = (DirectionsA, DirectionsB) if len(DirectionsA) <= len(DirectionsB) else (DirectionsB, DirectionsA)
+	if len(Ref) == 0:
+		return 0.0
+	return float(np.max(getSimilarityProfile(Ref, Mimic)))
+
+def scoreSimilarityTile(Directions: list[np.ndarray], Pairs: list[tuple[int, int]]) -> list[tuple[int, int, float]]:
+	return [(i, j, getPairSimilarity(Directions[i], Directions[j])) for i, j in Pairs]
+
+# The manifest records which takes (and which versions of them) and settings the matrix on disk belongs to
+def isSimilarityMatrixResumable(Directory: str, Manifest: dict[str]) -> bool:
+	if not os.path.exists(f"{Directory}matrix.npy") or not os.path.exists(f"{Directory}takes.json"):
+		return False
+	with open(f"{Directory}takes.json", "r") as file:
+		return json.load(file) == Manifest
+
+# Picks up the matrix left by an earlier run if it was for the same takes and settings, otherwise starts a new one
+# Pairs that haven't been scored yet are NaN
+def openSimilarityMatrix(Directory: str, Manifest: dict[str]) -> np.ndarray:
+	MatrixFileName = f"{Directory}matrix.npy"
+	if isSimilarityMatrixResumable(Directory, Manifest):
+		return np.lib.format.open_memmap(MatrixFileName, mode="r+")
+
+	os.makedirs(Directory, exist_ok=True)
+	Count = len(Manifest["takes"])
+	Matrix = np.lib.format.open_memmap(MatrixFileName, mode="w+", dtype=np.float64, shape=(Count, Count))
+	Matrix[:] = np.nan
+	np.fill_diagonal(Matrix, 1.0)
+	Matrix.flush()
+	with open(f"{Directory}takes.json", "w") as file:
+		json.dump(Manifest, file)
+	return Matrix
+
+# Manifest is structured like {"takes": [[FileName, ModifiedTime, Size], ...], "worldAgnostic": False, "comparisonFrequency": 0}
+# Takes saved without their frequency are assumed to be at DefaultFrequency
+def computeSimilarityMatrix(Directory: str, Manifest: dict[str], DefaultFrequency: float, Workers: int, TileSize: int, Job = None) -> np.ndarray:
+	Takes = Manifest["takes"]
+	WorldAgnostic = Manifest["worldAgnostic"]
+	Matrix = openSimilarityMatrix(Directory, Manifest)
+	try:
+		Tiles = [Tile for Tile in getSimilarityMatrixTiles(len(Takes), TileSize) if any(np.isnan(Matrix[i, j]) for i, j in Tile)]
+		if len(Tiles) == 0:
+			return np.array(Matrix)
+
+		# Loading, forward kinematics and directions, all done exactly once per take
+		# NOTE The takes skip the in memory caches, they would only push out the references that are kept warm there
+		Skeletons = []
+		Frequencies = []
+		for FileName, ModifiedTime, Size in Takes:
+			Take = readReferenceFile(FileName, UseCache = False)
+			Skeletons.append(Take["skeleton"])
+			Frequencies.append(Take.get("frequency", DefaultFrequency))
+		# NOTE Everything is brought down to the slowest take's rate, nothing gets upsampled
+		Frequency = min(Frequencies) if Manifest["comparisonFrequency"] <= 0 else min(min(Frequencies), Manifest["comparisonFrequency"])
+
+		BoneNames = None
+		Directions = []
+		for t, Skeleton in enumerate(Skeletons):
+			if isJobCancelled(Job):
+				return None
+			Names, TakeDirections = getSkeletonJointDirections(resampleSkeleton(Skeleton, Frequencies[t], Frequency, UseCache = False), WorldAgnostic)
+			BoneNames = Names if BoneNames == None else BoneNames
+			TakeDirections = getColumnsInBoneOrder(BoneNames, Names, TakeDirections)
+			if TakeDirections is None:
+				raise ValueError(f"{Takes[t][0]} doesn't have the same bones as {Takes[0][0]}")
+			Directions.append(TakeDirections)
+			reportJobProgress(Job, 0.2 * (t + 1) / len(Skeletons))
+
+		# NOTE Threads rather than processes, QTM's interpreter can't start processes that load this script (qtm only
+		# exists inside QTM) and numpy lets go of the GIL during the FFTs, so the tiles still run side by side
+		with concurrent.futures.ThreadPoolExecutor(max_workers=Workers if Workers > 0 else os.cpu_count()) as Executor:
+			Futures = [Executor.submit(scoreSimilarityTile, Directions, Tile) for Tile in Tiles]
+			for Done, Future in enumerate(concurrent.futures.as_completed(Futures)):
+				if Future.cancelled():
+					continue
+
+				# NOTE Saved before looking at the cancel, so every tile that got finished is kept for the next run
+				for i, j, Score in Future.result():
+					Matrix[i, j] = Score
+					Matrix[j, i] = Score
+				Matrix.flush()
+				reportJobProgress(Job, 0.2 + 0.8 * (Done + 1) / len(Tiles))
+
+				# The tiles that are already running still come through the loop and get saved
+				if isJobCancelled(Job):
+					for Pending in Futures:
+						Pending.cancel()
+
+		if isJobCancelled(Job):
+			return None
+		return np.array(Matrix)
+	finally:
+		# NOTE The file stays locked on Windows for as long as the map is open
+		del Matrix
+
+def writeSimilarityMatrixCSV(FileName: str, TakeNames: list[str], Matrix: np.ndarray) -> None:
+	with open(FileName, "w") as file:
+		file.write("," + ",".join(TakeNames) + "\n")
+		for t, TakeName in enumerate(TakeNames):
+			file.write(TakeName + "," + ",".join(f"{Score:.6f}" for Score in Matrix[t]) + "\n")
+
+def printSimilarityMatrix(TakeNames: list[str], Matrix: np.ndarray) -> None:
+	Count = len(TakeNames)
+	padding = max(len(TakeName) for TakeName in TakeNames)
+	print(f"{'Take':{padding}} | Mean  | Most similar")
+	MeanScores = (Matrix.sum(axis=1) - 1) / max(Count - 1, 1)
+	for t, TakeName in enumerate(TakeNames):
+		Others = np.where(np.arange(Count) == t, -np.inf, Matrix[t])
+		Closest = int(np.argmax(Others))
+		print(f"{TakeName:{padding}} | {MeanScores[t]:5.3f} | {TakeNames[Closest]} ({Matrix[t, Closest]:.3f})" if Count > 1 else f"{TakeName:{padding}} | {MeanScores[t]:5.3f} |")
+
+	# The take that is closest to all of the others is the best candidate for a reference
+	Best = int(np.argmax(MeanScores))
+	print(f"Most representative take: {TakeNames[Best]} (mean similarity {MeanScores[Best]:.3f})")
+
+def compareAllExportedTakes() -> None:
+	TakeNames = getSessionTakeFileNames()
+	if len(TakeNames) < 2:
+		qtm.gui.message.add_message("Mocap Mimic: Not enough takes", "Export at least two takes with 'Export Take' to compare them against each other", "error")
+		return
+
+	Directory = getSimilarityMatrixDirectory()
+	Takes = []
+	for TakeName in TakeNames:
+		FileName = f"{getProjectDirectory()}{TakeName}"
+		Stat = os.stat(FileName)
+		Takes.append([FileName, Stat.st_mtime_ns, Stat.st_size])
+
+	# NOTE The settings are copied so that changing them from the console doesn't affect a running job
+	Manifest = {"takes": Takes, "worldAgnostic": bSimilarityMatrixWorldAgnostic, "comparisonFrequency": comparisonFrequency}
+	DefaultFrequency = qtm.gui.timeline.get_frequency()
+	Workers = similarityMatrixWorkers
+	TileSize = similarityMatrixTileSize
+	print(f"Comparing {len(Takes)} takes, {len(Takes) * (len(Takes) - 1) // 2} pairs")
+	if isSimilarityMatrixResumable(Directory, Manifest):
+		print("Picking up where the last run left off")
+
+	def Work(Job):
+		Matrix = computeSimilarityMatrix(Directory, Manifest, DefaultFrequency, Workers, TileSize, Job)
+		if Matrix is not None:
+			writeSimilarityMatrixCSV(f"{Directory}matrix.csv", TakeNames, Matrix)
+		return Matrix
+
+	def OnDone(Matrix):
+		printSimilarityMatrix(TakeNames, Matrix)
+		print(f"Similarity matrix saved to {Directory}")
+
+	startBackgroundJob("Comparing all takes", Work, OnDone)
+
+# ----------------------------------------
+# [END] SIMILARITY MATRIX
+# ----------------------------------------
+
 # ----------------------------------------
 # [BEGIN] HELP
 # ----------------------------------------
@@ -973,94 +3784,289 @@ def printHelp():
 	print("And do not select trajectories associated with multiple different things at once")
 	print("")
 
+	print("Saving and comparing runs in the background, progress is shown in the message list while")
+	print("the 3D view redraws. Results are collected on the next redraw or the next time any Mocap Mimic")
+	print("command is used, 'Running Job Status' shows the progress and 'Cancel Running Job' stops")
+	print("whatever is running")
+	print("")
+
+	print("'Reload Script' picks up changes to the script without losing the segment markers,")
+	print("loaded references, the last comparison or anything that was set from the console")
+	print("")
+
 # ----------------------------------------
 # [END] HELP
 # ----------------------------------------
 
+# ----------------------------------------
+# [BEGIN] RELOADING
+# ----------------------------------------
+
+# Loading the script again normally starts over from nothing, so every reference, skeleton and comparison has to be
+# fetched and worked out again. reloadMocapMimic runs the newest version of the script in place and hands the
+# state below over to it. The menus aren't added a second time, only the functions behind them are swapped out.
+PersistentNames = [
+	"gSegments",
+	"CurrentSkeleton",
+	"BoneIDs",
+	"bDrawingEnabled",
+	"gDrawFunction",
+	"bHeatmapEnabled",
+	"gHeatmap",
+	"gLastComparison",
+	"gResampleCache",
+	"gDynamicsCache",
+	"gReferenceCache",
+	# Everything that can be set from the console, in the same order as the settings printed on load
+	"markerFrequency",
+	"bDoCoarsePass",
+	"WindowPassResolution",
+	"bRunInBackground",
+	"uiRequestBudgetInMs",
+	"timelineWindowsInSeconds",
+	"timelineEventCount",
+	"timelineDipThreshold",
+	"subsequenceThreshold",
+	"bSubsequenceWorldAgnostic",
+	"bChunkedComparison",
+	"chunkSizeInFrames",
+	"bBatchWorldAgnostic",
+	"similarityMatrixWorkers",
+	"bSimilarityMatrixWorldAgnostic",
+	"bHeatmapLOD",
+	"heatmapFrameBudgetInMs",
+	"heatmapMinorBoneLength",
+	"bPrintStatistics",
+	"bExportResults",
+	"bExportResultsCSV",
+	"autoSegmentPenalty",
+	"autoSegmentMinLengthInSeconds",
+	"bAlignYawOnly",
+	"alignmentUpAxis",
+	"dynamicsWindowInSeconds",
+	"dynamicsPolynomialOrder",
+	"dynamicsStillSpeed",
+	"comparisonFrequency",
+	"bUseResultCache",
+	"resultCacheMaxSizeInMB",
+	"bCompressReferences",
+	"compressionPositionPrecision",
+	"compressionRotationPrecision",
+]
+
+# NOTE The state is kept in a module of its own in sys.modules, which outlives the script's globals
+def getPersistentState() -> dict[str]:
+	Module = sys.modules.get("_mocap_mimic_state")
+	if Module == None:
+		Module = types.ModuleType("_mocap_mimic_state")
+		Module.State = {}
+		sys.modules["_mocap_mimic_state"] = Module
+	return Module.State
+
+gPersistentState = getPersistentState()
+
+# The menus that exist are only known for sure while reloading, any other time the script is loaded they are added again
+if not gPersistentState.get("Reloading", False):
+	gPersistentState.update({"Submenus": {}, "Commands": []})
+
+def addMenuSubmenu(ParentHandle, Name: str):
+	Key = f"{ParentHandle}/{Name}"
+	if not Key in gPersistentState["Submenus"]:
+		gPersistentState["Submenus"][Key] = qtm.gui.insert_menu_submenu(ParentHandle, Name)
+	return gPersistentState["Submenus"][Key]
+
+def addMenuCommand(MenuHandle, Label: str, CommandName: str, Function) -> None:
+	if not CommandName in gPersistentState["Commands"]:
+		qtm.gui.add_command(CommandName)
+		qtm.gui.insert_menu_button(MenuHandle, Label, CommandName)
+		gPersistentState["Commands"].append(CommandName)
+	qtm.gui.set_command_execute_function(CommandName, getPumpedCommand(Function))
+
+def savePersistentState() -> None:
+	with gCachedValueLock:
+		gPersistentState.update({"Globals": {Name: globals()[Name] for Name in PersistentNames}})
+
+def restorePersistentState() -> None:
+	global gDrawFunction
+	for Name, Value in gPersistentState.pop("Globals", {}).items():
+		globals()[Name] = Value
+
+	# The draw function is swapped for the new version of it
+	if gDrawFunction != None:
+		gDrawFunction = globals().get(gDrawFunction.__name__, gDrawFunction)
+		updateDrawFunction()
+
+def reloadMocapMimic() -> None:
+	pumpBackgroundJob()
+	if isJobRunning():
+		qtm.gui.message.add_message(f"Mocap Mimic: {gCurrentJob['Name']} is still running", "Wait for it to finish or cancel it before reloading", "error")
+		return
+
+	FileName = globals().get("__file__")
+	try:
+		with open(FileName, "r") as file:
+			Code = compile(file.read(), FileName, "exec")
+	except (TypeError, OSError, SyntaxError) as e:
+		qtm.gui.message.add_message("Mocap Mimic: Reload failed", str(e), "error")
+		print(f"Reload failed: {e!r}")
+		return
+
+	savePersistentState()
+	gPersistentState.update({"Reloading": True})
+	try:
+		exec(Code, globals())
+	except Exception as e:
+		qtm.gui.message.add_message("Mocap Mimic: Reload failed", str(e), "error")
+		print(f"Reload failed: {e!r}")
+	finally:
+		gPersistentState.update({"Reloading": False})
+		# NOTE If the new version failed part way through the old state is still put back
+		if "Globals" in gPersistentState:
+			restorePersistentState()
+	print("Mocap Mimic reloaded")
+
+restorePersistentState()
+
+# ----------------------------------------
+# [END] RELOADING
+# ----------------------------------------
+
 # ----------------------------------------
 # [BEGIN] ADDING MENU ITEMS
 # ----------------------------------------
 
 # Root menu option
 mocap_mimic_menu_name = "Mocap Mimic"
-mocap_mimic_menu_handle = qtm.gui.insert_menu_submenu(None, mocap_mimic_menu_name)
+mocap_mimic_menu_handle = addMenuSubmenu(None, mocap_mimic_menu_name)
 
 rigid_body_submenu_name = "Rigid Body"
-rigid_body_submenu_handle = qtm.gui.insert_menu_submenu(mocap_mimic_menu_handle, rigid_body_submenu_name)
+rigid_body_submenu_handle = addMenuSubmenu(mocap_mimic_menu_handle, rigid_body_submenu_name)
 
 skeleton_submenu_name = "Skeleton"
-skeleton_submenu_handle = qtm.gui.insert_menu_submenu(mocap_mimic_menu_handle, skeleton_submenu_name)
+skeleton_submenu_handle = addMenuSubmenu(mocap_mimic_menu_handle, skeleton_submenu_name)
 
 print_help_name = "mocap_mimic_print_help"
-qtm.gui.add_command(print_help_name)
-qtm.gui.set_command_execute_function(print_help_name, printHelp)
-qtm.gui.insert_menu_button(mocap_mimic_menu_handle, "Help", print_help_name)
+addMenuCommand(mocap_mimic_menu_handle, "Help", print_help_name, printHelp)
+
+# Setting up the reload function
+reload_name = "mocap_mimic_reload"
+addMenuCommand(mocap_mimic_menu_handle, "Reload Script", reload_name, reloadMocapMimic)
 
 # Setting up save function
 rigid_body_save_reference_function_name = "mocap_mimic_rigid_body_save_reference"
-qtm.gui.add_command(rigid_body_save_reference_function_name)
-qtm.gui.set_command_execute_function(rigid_body_save_reference_function_name, saveSelectedRigidBodyAsReference)
-qtm.gui.insert_menu_button(rigid_body_submenu_handle, "Save Reference", rigid_body_save_reference_function_name)
+addMenuCommand(rigid_body_submenu_handle, "Save Reference", rigid_body_save_reference_function_name, saveSelectedRigidBodyAsReference)
 
 # Setting up the compare function
 rigid_body_compare_selected_to_reference = "mocap_mimic_rigid_body_compare_selected_to_reference"
-qtm.gui.add_command(rigid_body_compare_selected_to_reference)
-qtm.gui.set_command_execute_function(rigid_body_compare_selected_to_reference, compareSelectedRigidBodyAgainstReference)
-qtm.gui.insert_menu_button(rigid_body_submenu_handle, "Compare to Reference", rigid_body_compare_selected_to_reference)
+addMenuCommand(rigid_body_submenu_handle, "Compare to Reference", rigid_body_compare_selected_to_reference, compareSelectedRigidBodyAgainstReference)
+
+# Setting up the 6DOF compare function
+rigid_body_compare_pose_to_reference = "mocap_mimic_rigid_body_compare_pose_to_reference"
+addMenuCommand(rigid_body_submenu_handle, "Compare to Reference (6DOF)", rigid_body_compare_pose_to_reference, compareSelectedRigidBodyPoseAgainstReference)
+
+# Setting up the dynamics compare function
+rigid_body_compare_dynamics_to_reference = "mocap_mimic_rigid_body_compare_dynamics_to_reference"
+addMenuCommand(rigid_body_submenu_handle, "Compare to Reference (Dynamics)", rigid_body_compare_dynamics_to_reference, compareSelectedRigidBodyDynamicsAgainstReference)
 
 # Setting up save function
 skeleton_save_reference_function_name = "mocap_mimic_skeleton_save_reference"
-qtm.gui.add_command(skeleton_save_reference_function_name)
-qtm.gui.set_command_execute_function(skeleton_save_reference_function_name, saveSelectedSkeletonAsReference)
-qtm.gui.insert_menu_button(skeleton_submenu_handle, "Save Reference", skeleton_save_reference_function_name)
+addMenuCommand(skeleton_submenu_handle, "Save Reference", skeleton_save_reference_function_name, saveSelectedSkeletonAsReference)
+
+# Setting up the export take function
+skeleton_export_take_function_name = "mocap_mimic_skeleton_export_take"
+addMenuCommand(skeleton_submenu_handle, "Export Take", skeleton_export_take_function_name, exportSelectedSkeletonAsTake)
 
 # Setting up the compare function
 skeleton_compare_selected_to_reference = "mocap_mimic_skeleton_compare_selected_to_reference"
-qtm.gui.add_command(skeleton_compare_selected_to_reference)
-qtm.gui.set_command_execute_function(skeleton_compare_selected_to_reference, compareSelectedSkeletonAgainstReference)
-qtm.gui.insert_menu_button(skeleton_submenu_handle, "Compare to Reference (Trajectories)", skeleton_compare_selected_to_reference)
+addMenuCommand(skeleton_submenu_handle, "Compare to Reference (Trajectories)", skeleton_compare_selected_to_reference, compareSelectedSkeletonAgainstReference)
+
+# Setting up the dynamics compare function
+skeleton_compare_dynamics_to_reference = "mocap_mimic_skeleton_compare_dynamics_to_reference"
+addMenuCommand(skeleton_submenu_handle, "Compare to Reference (Trajectories) (Dynamics)", skeleton_compare_dynamics_to_reference, compareSelectedSkeletonDynamicsAgainstReference)
 
 # Setting up the compare function
 skeleton_compare_selected_to_reference_using_bones = "mocap_mimic_skeleton_compare_selected_bones_to_reference"
-qtm.gui.add_command(skeleton_compare_selected_to_reference_using_bones)
-qtm.gui.set_command_execute_function(skeleton_compare_selected_to_reference_using_bones, compareSelectedSkeletonBonesAgainstReference)
-qtm.gui.insert_menu_button(skeleton_submenu_handle, "Compare to Reference (Bones)", skeleton_compare_selected_to_reference_using_bones)
+addMenuCommand(skeleton_submenu_handle, "Compare to Reference (Bones)", skeleton_compare_selected_to_reference_using_bones, compareSelectedSkeletonBonesAgainstReference)
 
 # Setting up the compare function
 skeleton_compare_selected_to_reference_using_bones_world_agnostic = "mocap_mimic_skeleton_compare_selected_bones_to_reference_world_agnostic"
-qtm.gui.add_command(skeleton_compare_selected_to_reference_using_bones_world_agnostic)
-qtm.gui.set_command_execute_function(skeleton_compare_selected_to_reference_using_bones_world_agnostic, compareSelectedSkeletonBonesAgainstReferenceWorldAgnostic)
-qtm.gui.insert_menu_button(skeleton_submenu_handle, "Compare to Reference (Bones) (World Agnostic)", skeleton_compare_selected_to_reference_using_bones_world_agnostic)
+addMenuCommand(skeleton_submenu_handle, "Compare to Reference (Bones) (World Agnostic)", skeleton_compare_selected_to_reference_using_bones_world_agnostic, compareSelectedSkeletonBonesAgainstReferenceWorldAgnostic)
+
+# Setting up the facing invariant compare function
+skeleton_compare_selected_to_reference_using_bones_facing_invariant = "mocap_mimic_skeleton_compare_selected_bones_to_reference_facing_invariant"
+addMenuCommand(skeleton_submenu_handle, "Compare to Reference (Bones) (Facing Invariant)", skeleton_compare_selected_to_reference_using_bones_facing_invariant, compareSelectedSkeletonBonesAgainstReferenceFacingInvariant)
+
+# Setting up the bone dynamics compare function
+skeleton_compare_selected_to_reference_using_bones_dynamics = "mocap_mimic_skeleton_compare_selected_bones_to_reference_dynamics"
+addMenuCommand(skeleton_submenu_handle, "Compare to Reference (Bones) (Dynamics)", skeleton_compare_selected_to_reference_using_bones_dynamics, compareSelectedSkeletonBonesDynamicsAgainstReference)
+
+# Setting up the heatmap function
+skeleton_toggle_similarity_heatmap = "mocap_mimic_skeleton_toggle_similarity_heatmap"
+addMenuCommand(skeleton_submenu_handle, "Toggle Similarity Heatmap", skeleton_toggle_similarity_heatmap, toggleSimilarityHeatmap)
+
+# Setting up the batched compare function
+skeleton_compare_all_to_reference = "mocap_mimic_skeleton_compare_all_to_reference"
+addMenuCommand(skeleton_submenu_handle, "Compare All Skeletons to Reference", skeleton_compare_all_to_reference, compareAllSkeletonsAgainstReference)
+
+# Setting up the similarity matrix function
+skeleton_compare_all_exported_takes = "mocap_mimic_skeleton_compare_all_exported_takes"
+addMenuCommand(skeleton_submenu_handle, "Compare All Exported Takes", skeleton_compare_all_exported_takes, compareAllExportedTakes)
+
+# Setting up the subsequence search function
+skeleton_find_reference_occurrences = "mocap_mimic_skeleton_find_reference_occurrences"
+addMenuCommand(skeleton_submenu_handle, "Find All Occurrences of Reference", skeleton_find_reference_occurrences, findReferenceOccurrencesInSelectedSkeleton)
 
 # Setting up the draw at skeleton function
 draw_sphere_at_skeleton = "mocap_mimic_draw_sphere_at_skeleton"
-qtm.gui.add_command(draw_sphere_at_skeleton)
-qtm.gui.set_command_execute_function(draw_sphere_at_skeleton, drawSphereAtSkeletonRoot)
-qtm.gui.insert_menu_button(skeleton_submenu_handle, "Draw Sphere at Skeleton", draw_sphere_at_skeleton)
+addMenuCommand(skeleton_submenu_handle, "Draw Sphere at Skeleton", draw_sphere_at_skeleton, drawSphereAtSkeletonRoot)
 
 # Setting up the compare function
 print_selected_name = "mocap_mimic_print_selected"
-qtm.gui.add_command(print_selected_name)
-qtm.gui.set_command_execute_function(print_selected_name, printSelected)
-qtm.gui.insert_menu_button(mocap_mimic_menu_handle, "Print Selections", print_selected_name)
+addMenuCommand(mocap_mimic_menu_handle, "Print Selections", print_selected_name, printSelected)
+
+# Setting up the timeline export function
+export_similarity_timeline_name = "mocap_mimic_export_similarity_timeline"
+addMenuCommand(mocap_mimic_menu_handle, "Export Similarity Timeline", export_similarity_timeline_name, exportSimilarityTimeline)
+
+# Setting up the timeline events function
+add_worst_dips_as_events_name = "mocap_mimic_add_worst_dips_as_events"
+addMenuCommand(mocap_mimic_menu_handle, "Mark Worst Dips on Timeline", add_worst_dips_as_events_name, addWorstDipsAsEvents)
+
+# Setting up the result export function
+export_last_comparison_result_name = "mocap_mimic_export_last_comparison_result"
+addMenuCommand(mocap_mimic_menu_handle, "Export Last Comparison Results", export_last_comparison_result_name, exportLastComparisonResult)
+
+# Setting up the clear result cache function
+clear_result_cache_name = "mocap_mimic_clear_result_cache"
+addMenuCommand(mocap_mimic_menu_handle, "Clear Result Cache", clear_result_cache_name, clearResultCache)
+
+# Setting up the cancel job function
+cancel_job_name = "mocap_mimic_cancel_job"
+addMenuCommand(mocap_mimic_menu_handle, "Cancel Running Job", cancel_job_name, cancelBackgroundJob)
+
+# Setting up the job status function
+job_status_name = "mocap_mimic_job_status"
+addMenuCommand(mocap_mimic_menu_handle, "Running Job Status", job_status_name, printBackgroundJobStatus)
 
 # Setting up the add segment marker function
 add_segment_marker_name = "mocap_mimic_add_segment_marker"
-qtm.gui.add_command(add_segment_marker_name)
-qtm.gui.set_command_execute_function(add_segment_marker_name, addSegmentMarker)
-qtm.gui.insert_menu_button(mocap_mimic_menu_handle, "Add Segment Marker", add_segment_marker_name)
+addMenuCommand(mocap_mimic_menu_handle, "Add Segment Marker", add_segment_marker_name, addSegmentMarker)
 
 # Setting up the clear segment marker function
 clear_segment_markers_name = "mocap_mimic_clear_segment_markers"
-qtm.gui.add_command(clear_segment_markers_name)
-qtm.gui.set_command_execute_function(clear_segment_markers_name, clearSegmentMarkers)
-qtm.gui.insert_menu_button(mocap_mimic_menu_handle, "Clear Segment Markers", clear_segment_markers_name)
+addMenuCommand(mocap_mimic_menu_handle, "Clear Segment Markers", clear_segment_markers_name, clearSegmentMarkers)
 
 # Setting up the clear segment marker function
 add_equidistant_markers_name = "mocap_mimic_add_equidistant_markers"
-qtm.gui.add_command(add_equidistant_markers_name)
-qtm.gui.set_command_execute_function(add_equidistant_markers_name, addEquidistantMarkers)
-qtm.gui.insert_menu_button(mocap_mimic_menu_handle, "Add Equidistant Segment Markers", add_equidistant_markers_name)
+addMenuCommand(mocap_mimic_menu_handle, "Add Equidistant Segment Markers", add_equidistant_markers_name, addEquidistantMarkers)
+
+# Setting up the automatic segment markers function
+add_automatic_segment_markers_name = "mocap_mimic_add_automatic_segment_markers"
+addMenuCommand(mocap_mimic_menu_handle, "Add Automatic Segment Markers", add_automatic_segment_markers_name, addAutomaticSegmentMarkers)
+
+# Setting up the automatic reference segments function
+add_automatic_segments_to_reference_name = "mocap_mimic_add_automatic_segments_to_reference"
+addMenuCommand(mocap_mimic_menu_handle, "Segment Saved Reference Automatically", add_automatic_segments_to_reference_name, addAutomaticSegmentsToReference)
 
 # ----------------------------------------
 # [END] ADDING MENU ITEMS
@@ -1082,7 +4088,35 @@ info = [
 	"Mocap Mimic: Current values of user-set variables:", 
 	f"markerFrequency: float = {markerFrequency}, call setMarkerFrequencyInSeconds(NewValue: float) to change this value", 
 	f"bDoCoarsePass: bool = {bDoCoarsePass}, call setCoarsePassEnabled(NewValue: bool) to change this value", 
-	f"WindowPassResolution: int = {WindowPassResolution}, call setWindowPassResolution(NewIndex: int) to change this value"
+	f"WindowPassResolution: int = {WindowPassResolution}, call setWindowPassResolution(NewIndex: int) to change this value",
+	f"bRunInBackground: bool = {bRunInBackground}, call setRunInBackground(NewValue: bool) to change this value",
+	f"uiRequestBudgetInMs: float = {uiRequestBudgetInMs}, call setUIRequestBudgetInMs(NewValue: float) to change this value",
+	f"timelineWindowsInSeconds: list[float] = {timelineWindowsInSeconds}, call setTimelineWindowsInSeconds(NewValue: list[float]) to change this value",
+	f"timelineEventCount: int = {timelineEventCount}, call setTimelineEventCount(NewValue: int) to change this value",
+	f"timelineDipThreshold: float = {timelineDipThreshold}, call setTimelineDipThreshold(NewValue: float) to change this value",
+	f"subsequenceThreshold: float = {subsequenceThreshold}, call setSubsequenceThreshold(NewValue: float) to change this value",
+	f"bSubsequenceWorldAgnostic: bool = {bSubsequenceWorldAgnostic}, call setSubsequenceWorldAgnostic(NewValue: bool) to change this value",
+	f"bChunkedComparison: bool = {bChunkedComparison}, call setChunkedComparisonEnabled(NewValue: bool) to change this value",
+	f"chunkSizeInFrames: int = {chunkSizeInFrames}, call setChunkSizeInFrames(NewValue: int) to change this value",
+	f"bBatchWorldAgnostic: bool = {bBatchWorldAgnostic}, call setBatchWorldAgnostic(NewValue: bool) to change this value",
+	f"similarityMatrixWorkers: int = {similarityMatrixWorkers}, call setSimilarityMatrixWorkers(NewValue: int) to change this value",
+	f"bSimilarityMatrixWorldAgnostic: bool = {bSimilarityMatrixWorldAgnostic}, call setSimilarityMatrixWorldAgnostic(NewValue: bool) to change this value",
+	f"bHeatmapLOD: bool = {bHeatmapLOD}, call setHeatmapLODEnabled(NewValue: bool) to change this value",
+	f"heatmapFrameBudgetInMs: float = {heatmapFrameBudgetInMs}, call setHeatmapFrameBudgetInMs(NewValue: float) to change this value",
+	f"heatmapMinorBoneLength: float = {heatmapMinorBoneLength}, call setHeatmapMinorBoneLength(NewValue: float) to change this value",
+	f"bPrintStatistics: bool = {bPrintStatistics}, call setPrintStatisticsEnabled(NewValue: bool) to change this value",
+	f"bExportResults: bool = {bExportResults}, bExportResultsCSV: bool = {bExportResultsCSV}, call setExportResultsEnabled(NewValue: bool, WithCSV: bool) to change these values",
+	f"autoSegmentPenalty: float = {autoSegmentPenalty}, call setAutoSegmentPenalty(NewValue: float) to change this value",
+	f"autoSegmentMinLengthInSeconds: float = {autoSegmentMinLengthInSeconds}, call setAutoSegmentMinLengthInSeconds(NewValue: float) to change this value",
+	f"bAlignYawOnly: bool = {bAlignYawOnly}, call setAlignYawOnly(NewValue: bool) to change this value",
+	f"dynamicsWindowInSeconds: float = {dynamicsWindowInSeconds}, call setDynamicsWindowInSeconds(NewValue: float) to change this value",
+	f"dynamicsPolynomialOrder: int = {dynamicsPolynomialOrder}, call setDynamicsPolynomialOrder(NewValue: int) to change this value",
+	f"dynamicsStillSpeed: float = {dynamicsStillSpeed}, call setDynamicsStillSpeed(NewValue: float) to change this value",
+	f"comparisonFrequency: float = {comparisonFrequency}, call setComparisonFrequency(NewValue: float) to change this value",
+	f"bUseResultCache: bool = {bUseResultCache}, call setResultCacheEnabled(NewValue: bool) to change this value",
+	f"resultCacheMaxSizeInMB: float = {resultCacheMaxSizeInMB}, call setResultCacheMaxSizeInMB(NewValue: float) to change this value",
+	f"bCompressReferences: bool = {bCompressReferences}, call setCompressionEnabled(NewValue: bool) to change this value",
+	f"compressionPositionPrecision: float = {compressionPositionPrecision}, compressionRotationPrecision: float = {compressionRotationPrecision}, call setCompressionPrecision(PositionPrecision: float, RotationPrecision: float) to change these values"
 ]
 
 PrintAsBox(info)
\ No newline at end of file